@@ -1,4 +1,9 @@
 import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 import numpy as np
 from PIL import Image
 
@@ -7,6 +12,8 @@ DEF_IMHEIGHT = 600
 DEF_IMWIDTH = 592
 DEF_IMHEAD = 520
 
+COPY_BUFSIZE = 1024**2  # bytes copied at a time when stripping headers from data files
+
 
 class ParseError(Exception):
     def __init__(self, message, errors):
@@ -46,7 +53,21 @@ def energy_to_filenumber(el, val):
         return None
 
 
-def process_LEEM_Data(dirname, ht=0, wd=0, bits=None, byte='L'):
+def gen_energy_list(mine, stepe, num):
+    """
+    Generate the list of energy values for a data set
+    :argument mine: float starting energy in eV
+    :argument stepe: float energy step in eV between files
+    :argument num: integer number of files in the data set
+    :return elist: list of num energy values rounded to two decimals
+    """
+    elist = [mine]
+    while len(elist) < num:
+        elist.append(round(elist[-1] + stepe, 2))
+    return elist
+
+
+def process_LEEM_Data(dirname, ht=0, wd=0, bits=None, byte='L', workers=None, callback=None):
     """
     read in all .dat files in current data directory
     process each .dat file into a numpy array
@@ -58,60 +79,659 @@ def process_LEEM_Data(dirname, ht=0, wd=0, bits=None, byte='L'):
     :param wd: integer pixel width of image
     :param bits: integer representing bit depth of image, default is 16 bit
     :param byte: string representing byte order, 'L' for Little-Endian (Intel), 'B' for Big-Endian (Motorola)
-    :return dat_arr: 3d numpy array
+    :param workers: integer number of threads used to read files concurrently, default None reads serially
+    :param callback: optional callable(dat_arr, count) called as each file is loaded in order;
+                     frames [0, count) of dat_arr are complete
+    :return dat_arr: 3d numpy array, or None if no files are found or the bit size is invalid
     """
     print('Processing Data ...')
     # progress = pb.ProgressBar(fd=sys.stdout)
-    arr_list = []
-    flag = True
     # add filter on file names to exclude hidden files beginning with a leading period
     print("Searching for files in {}".format(dirname))
-    files = [name for name in os.listdir(dirname) if name.endswith('.dat') and not name.startswith(".")]
-    files.sort()
+    # file sizes come from directory metadata; no file is read twice
+    entries = scan_data_files(dirname, '.dat')
+    files = [name for name, size in entries]
+    if not files:
+        print("Error: no .dat files found in {}".format(dirname))
+        return None
     print('First file is {}.'.format(files[0]))
+    paths = [os.path.join(dirname, fl) for fl in files]
 
-    for fl in files:
-        with open(os.path.join(dirname, fl), 'rb') as f:
-            # dynamically calculate file header length
-            if ht == 0 and wd == 0:
-                hdln = DEF_IMHEAD
-                ht = DEF_IMHEIGHT
-                wd = DEF_IMWIDTH
-            else:
-                hdln = len(f.read()) - (int(bits/8)*ht*wd)  # multiply by number of bytes per pixel
+    # Generate format string given a bit size read from YAML config file
+    formatstring = dat_format_string(bits, byte)
+    if formatstring is None:
+        return None
 
-            if flag:
-                print('Calculated Header Length of First File: {}'.format(hdln))
-                # only print first file header length
-                flag = False
-            f.seek(0)
+    if ht == 0 and wd == 0:
+        hdln = DEF_IMHEAD
+        ht = DEF_IMHEIGHT
+        wd = DEF_IMWIDTH
+    else:
+        try:
+            hdln = header_length([size for name, size in entries],
+                                 np.dtype(formatstring).itemsize*ht*wd)
+        except ParseError as e:
+            print(e.message)
+            print("Check for correct Image Width, Height and Bit Depth in YAML experiment file")
+            return None
+        print('Calculated Header Length of First File: {}'.format(hdln))
+
+    if workers is not None and workers > 1:
+        return read_dat_parallel(paths, ht, wd, formatstring,
+                                 hdln=hdln, workers=workers, callback=callback)
+
+    # Size the output up front and store it energy-major so that each file
+    # is read directly into its own contiguous slot; no intermediate list
+    # of arrays and no final stacking copy
+    dat_arr = np.empty((len(paths), ht, wd), dtype=formatstring)
+    for idx, pth in enumerate(paths):
+        read_dat_into(pth, dat_arr[idx], hdln=hdln)
+        if callback is not None:
+            callback(dat_arr.transpose(1, 2, 0), idx + 1)
+    # print('Returning New Array Shape: {}'.format(dat_arr.shape))
+    # (height, width, file number) view of the same memory
+    return dat_arr.transpose(1, 2, 0)
 
-            # Generate format string given a bit size read from YAML config file
-            if bits == 8 and byte == 'L':
-                formatstring = '<u1'  # 1 byte (8 bits) per pixel
-            elif bits == 8 and byte == 'B':
-                formatstring = '>u1'
 
-            elif bits == 16 and byte == 'L':
-                formatstring = '<u2'  # 2 bytes (16 bits) per pixel
-            elif bits == 16 and byte == 'B':
-                formatstring = '>u2'
+def scan_data_files(dirname, ext):
+    """
+    List the data files in a directory along with their sizes
+    Sizes are taken from directory metadata so no file contents are read.
+    Hidden files beginning with a leading period are excluded.
 
-            elif bits is None:
-                formatstring = '<u2'  # default to 16 bit images
+    :param dirname: string path to data directory
+    :param ext: string file extension including the leading period, ex. '.dat'
+    :return: list of (name, size in bytes) tuples sorted by file name
+    """
+    entries = [(entry.name, entry.stat().st_size) for entry in os.scandir(dirname)
+               if entry.name.endswith(ext) and not entry.name.startswith(".") and entry.is_file()]
+    entries.sort()
+    return entries
 
-            else:
-                print("Error in process_LEEM_Data() - unknown bit size when loading raw data")
-                print("Check for incorrect bitsize in YAML experiment file")
 
-            arr_list.append(np.fromstring(f.read()[hdln:],
-                                          formatstring).reshape((ht, wd)))
-    print('Creating 3D Array ...')
+def header_length(sizes, payload):
+    """
+    Calculate the header length shared by a set of raw data files from their sizes
+    Files holding images of the same geometry and bit depth must all share the same size,
+    so any mismatch is reported before reading begins.
+
+    :param sizes: list of integer file sizes in bytes
+    :param payload: integer number of bytes of pixel data in each file
+    :return: integer header length in bytes
+    """
+    if not sizes:
+        raise ParseError(message="No files found to calculate header length.", errors=None)
+    mismatched = [idx for idx, size in enumerate(sizes) if size != sizes[0]]
+    if mismatched:
+        raise ParseError(message="Found {0} files whose size differs from the first file ({1} bytes).".format(
+                             len(mismatched), sizes[0]),
+                         errors={'indices': mismatched})
+    hdln = sizes[0] - payload
+    if hdln < 0:
+        raise ParseError(message="Incorrect value calculated for header length: {}".format(hdln),
+                         errors=None)
+    return hdln
+
+
+def read_dat_into(path, out, hdln=None):
+    """
+    Read the pixel data of a single raw .dat file directly into a preallocated array
+    :param path: string path to .dat file
+    :param out: C-contiguous 2d numpy array (height, width) with the pixel format of the file
+    :param hdln: integer header length; default None treats everything before the last out.nbytes as header
+    :return out: the filled array
+    """
+    with open(path, 'rb') as f:
+        if hdln is None:
+            f.seek(-out.nbytes, os.SEEK_END)
+        else:
+            f.seek(hdln)
+        nread = f.readinto(out)
+    if nread != out.nbytes:
+        raise IOError("File {0} is too short: read {1} of {2} bytes.".format(path, nread, out.nbytes))
+    return out
+
+
+def read_dat_parallel(paths, ht, wd, formatstring, hdln=None, workers=4, callback=None):
+    """
+    Read a list of raw .dat files concurrently using a pool of threads
+    File reads release the GIL, so several requests can be in flight at once
+    which hides the latency of network or solid state storage.
+    Frames are read directly into a preallocated 3d array in file order.
+
+    :param paths: list of string paths to .dat files in energy order
+    :param ht: integer pixel height of image
+    :param wd: integer pixel width of image
+    :param formatstring: numpy format string for pixel data, ex. '<u2'
+    :param hdln: integer header length; default None calculates it per file
+    :param workers: integer number of reader threads
+    :param callback: optional callable(dat_arr, count) called as files complete in order
+    :return dat_arr: 3d numpy array (height, width, file number)
+    """
+    print('Reading {0} files using {1} threads ...'.format(len(paths), workers))
+    dat_arr = np.empty((len(paths), ht, wd), dtype=formatstring)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # consume the results in order so that any read errors are raised here
+        results = pool.map(lambda idx: read_dat_into(paths[idx], dat_arr[idx], hdln=hdln),
+                           range(len(paths)))
+        for idx, _ in enumerate(results):
+            if callback is not None:
+                callback(dat_arr.transpose(1, 2, 0), idx + 1)
+    return dat_arr.transpose(1, 2, 0)
+
+
+def dat_format_string(bits=None, byte='L'):
+    """
+    Generate a numpy format string for raw data given the bit size and byte order
+    read from the YAML experiment config file
+    :param bits: integer bit depth of image, default None for 16 bit
+    :param byte: string 'L' for Little-Endian or 'B' for Big-Endian
+    :return formatstring: numpy dtype string, ex. '<u2'
+    """
+    if bits == 8 and byte == 'L':
+        formatstring = '<u1'  # 1 byte (8 bits) per pixel
+    elif bits == 8 and byte == 'B':
+        formatstring = '>u1'
+
+    elif bits == 16 and byte == 'L':
+        formatstring = '<u2'  # 2 bytes (16 bits) per pixel
+    elif bits == 16 and byte == 'B':
+        formatstring = '>u2'
+
+    elif bits is None:
+        formatstring = '<u2'  # default to 16 bit images
+
+    else:
+        print("Error in dat_format_string() - unknown bit size when loading raw data")
+        print("Check for incorrect bitsize in YAML experiment file")
+        formatstring = None
+    return formatstring
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache of numpy arrays
+    Entries are evicted, oldest first, once the total size of the cached arrays
+    exceeds cache_bytes or the number of entries exceeds max_items. The entry
+    stored most recently is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, cache_bytes=None, max_items=None):
+        """
+        :param cache_bytes: integer maximum total size in bytes of cached arrays, default None for no limit
+        :param max_items: integer maximum number of entries, default None for no limit
+        """
+        self.cache_limit = cache_bytes
+        self.max_items = max_items
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        """
+        :param key: hashable key of the entry
+        :param default: value returned if key is not cached
+        :return: cached array, marked as most recently used, or default
+        """
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+            self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        """
+        Store an entry as the most recently used and evict old entries to stay within the limits
+        :param key: hashable key of the entry
+        :param value: numpy array or other object with an nbytes attribute
+        :return: value
+        """
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._items[key] = value
+            self.nbytes += value.nbytes
+            while len(self._items) > 1 and \
+                    ((self.cache_limit is not None and self.nbytes > self.cache_limit) or
+                     (self.max_items is not None and len(self._items) > self.max_items)):
+                self.nbytes -= self._items.popitem(last=False)[1].nbytes
+        return value
+
+    def clear(self):
+        """Discard all entries."""
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+class LazyStack(object):
+    """
+    Read-only array-like stack of 2D frames which are only read from disk when accessed
+    Indexing follows numpy semantics for a 3d array in (row, column, energy) order
+    so that frames, dat[:, :, idx], and I(V) curves, dat[r, c, :], can be pulled
+    from the stack without ever holding the full data set in memory.
+    Sub-classes must implement get_frame() returning a 2d array-like for one energy.
+    """
+
+    def __init__(self, shape, dtype):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.ndim = 3
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1] * self.shape[2]
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def get_frame(self, idx):
+        """
+        :param idx: integer index along the energy axis
+        :return: 2d array-like of shape (self.shape[0], self.shape[1])
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError("Too many indices for 3d data stack")
+        rows, cols, energies = key + (slice(None),) * (3 - len(key))
+        indices = np.arange(self.shape[2])[energies]
+        if indices.ndim == 0:
+            # single energy requested - return a 2d frame (or part of one)
+            return np.array(self.get_frame(int(indices))[rows, cols])
+
+        # determine the output shape without touching any data
+        dummy = np.lib.stride_tricks.as_strided(np.zeros(1, dtype=bool),
+                                                shape=self.shape[:2],
+                                                strides=(0, 0))
+        out = np.empty(dummy[rows, cols].shape + indices.shape, dtype=self.dtype)
+        for idx, frame in enumerate(self.get_frames([int(fnum) for fnum in indices])):
+            out[..., idx] = frame[rows, cols]
+        return out
+
+    def get_frames(self, indices):
+        """
+        Sub-classes may override this to read several frames at once
+        :param indices: list of integer indices along the energy axis
+        :return: iterable of 2d array-like frames in the order requested
+        """
+        return (self.get_frame(idx) for idx in indices)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self[:, :, :]
+        return self[:, :, :].astype(dtype)
+
+    def copy(self):
+        """Load the full stack into memory as a 3d numpy array."""
+        return self[:, :, :]
+
+
+def max_open_maps(num):
+    """
+    Number of memory maps a MappedStack may keep open, each of which holds a file handle
+    Up to half of the process limit on open files is used so that loading other
+    files is never starved.
+    :param num: integer number of files in the stack
+    :return: integer maximum number of open maps
+    """
+    try:
+        import resource  # not available on Windows
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError, OSError):
+        return min(num, 128)
+    if soft == resource.RLIM_INFINITY:
+        return num
+    return max(1, min(num, soft // 2))
+
+
+class MappedStack(LazyStack):
+    """
+    Stack of raw binary .dat files accessed via memory mapping
+    Each file is mapped only when a frame touching it is requested, letting the
+    operating system page data in on demand. At most max_open maps are held open
+    at once to avoid exhausting file handles. When the stack has more files than
+    that, I(V) curves at a single pixel are read directly from each file instead
+    of remapping every file on every curve.
+    """
+
+    def __init__(self, files, ht, wd, hdln, dtype, max_open=None):
+        """
+        :param files: list of string paths to .dat files in energy order
+        :param ht: integer pixel height of image
+        :param wd: integer pixel width of image
+        :param hdln: integer header length in bytes
+        :param dtype: numpy dtype or format string for raw pixels
+        :param max_open: maximum number of file maps to keep open, default from max_open_maps()
+        """
+        super(MappedStack, self).__init__((ht, wd, len(files)), dtype)
+        self.files = files
+        self.hdln = hdln
+        if max_open is None:
+            max_open = max_open_maps(len(files))
+        self.max_open = max_open
+        self._maps = LRUCache(max_items=max_open)
+
+    def get_frame(self, idx):
+        mp = self._maps.get(idx)
+        if mp is None:
+            mp = self._maps.put(idx, np.memmap(self.files[idx], dtype=self.dtype, mode='r',
+                                               offset=self.hdln, shape=self.shape[:2]))
+        return mp
+
+    def __getitem__(self, key):
+        if (isinstance(key, tuple) and len(key) == 3 and len(self.files) > self.max_open and
+                isinstance(key[0], (int, np.integer)) and isinstance(key[1], (int, np.integer))):
+            return self.read_curve(key[0], key[1], key[2])
+        return super(MappedStack, self).__getitem__(key)
+
+    def read_curve(self, r, c, energies=slice(None)):
+        """
+        Read the values of one pixel directly from each file without mapping it
+        :param r: integer row (y) coordinate
+        :param c: integer column (x) coordinate
+        :param energies: integer, slice or index array along the energy axis
+        :return: 1d numpy array of intensity vs energy at pixel (r, c), or a scalar for an integer energy
+        """
+        ht, wd, num = self.shape
+        r, c = np.arange(ht)[r], np.arange(wd)[c]  # bounds check and negative indices
+        indices = np.arange(num)[energies]
+        itemsize = self.dtype.itemsize
+        offset = self.hdln + int(r*wd + c)*itemsize
+        out = np.empty(indices.shape, dtype=self.dtype)
+        flat = out.reshape(-1)
+        for pos, idx in enumerate(indices.reshape(-1)):
+            fd = os.open(self.files[idx], os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                if hasattr(os, 'pread'):
+                    buf = os.pread(fd, itemsize, offset)
+                else:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                    buf = os.read(fd, itemsize)
+            finally:
+                os.close(fd)
+            if len(buf) != itemsize:
+                raise IOError("File {} is too short for the image size and header length.".format(self.files[idx]))
+            flat[pos] = np.frombuffer(buf, dtype=self.dtype)[0]
+        return out if indices.ndim else out[()]
+
+
+class GrowableStack(object):
+    """
+    3d data stack (row, col, energy) which can be extended one frame at a time
+    Frames are stored energy-major in a buffer with spare capacity. When the
+    capacity is exhausted the buffer grows geometrically, so appending a frame
+    costs amortized O(frame size) rather than a copy of the whole stack.
+    """
+    GROWTH = 1.5  # factor by which capacity grows when the buffer is full
+
+    def __init__(self, data, capacity=None):
+        """
+        :param data: 3d numpy array or array-like (row, col, energy) holding the initial frames
+        :param capacity: integer initial number of frames to allocate, default leaves room for 25% more
+        """
+        ht, wd, num = data.shape
+        if capacity is None:
+            capacity = num + max(16, num//4)
+        self._buf = np.empty((max(capacity, num), ht, wd), dtype=data.dtype)
+        for idx in range(num):
+            self._buf[idx] = data[:, :, idx]
+        self.count = num
+
+    @property
+    def data(self):
+        """(row, col, energy) view of the frames appended so far; no copy is made."""
+        return self._buf[:self.count].transpose(1, 2, 0)
+
+    def append(self, frame):
+        """
+        :param frame: 2d array (row, col) to add at the end of the energy axis
+        :return: view of the extended data
+        """
+        if self.count == self._buf.shape[0]:
+            capacity = int(self._buf.shape[0]*self.GROWTH) + 1
+            buf = np.empty((capacity,) + self._buf.shape[1:], dtype=self._buf.dtype)
+            buf[:self.count] = self._buf[:self.count]
+            self._buf = buf
+        self._buf[self.count] = frame
+        self.count += 1
+        return self.data
+
+
+def downsample(img):
+    """
+    Reduce the resolution of an image by a factor of two using the mean of each 2x2 block
+    An odd final row or column is dropped.
+    :param img: 2d array-like (row, col)
+    :return: 2d float32 numpy array of shape (row//2, col//2)
+    """
+    ht = (img.shape[0] // 2) * 2
+    wd = (img.shape[1] // 2) * 2
+    img = np.asarray(img[:ht, :wd], dtype=np.float32)
+    return (img[0::2, 0::2] + img[1::2, 0::2] + img[0::2, 1::2] + img[1::2, 1::2]) * 0.25
+
+
+class ImagePyramid(object):
+    """
+    Multi-resolution levels of each frame in a data stack for display
+    Level 0 is the full resolution frame and each following level halves both
+    dimensions. Levels are built only when first requested, each from the level
+    above it, and kept in a bounded LRU cache so that stepping through energies
+    or zooming re-uses previously built images.
+    """
+    MIN_SIZE = 1024  # images no larger than this in either dimension have a single level
+
+    def __init__(self, get_frame, shape, cache_bytes=256*1024**2):
+        """
+        :param get_frame: callable taking an integer energy index and returning a 2d frame
+        :param shape: tuple (height, width) of full resolution frames
+        :param cache_bytes: integer maximum size in bytes of downsampled images kept in memory
+        """
+        self.get_frame = get_frame
+        self.shape = tuple(shape[:2])
+        self.nlevels = 1
+        size = max(self.shape)
+        while size > self.MIN_SIZE:
+            size //= 2
+            self.nlevels += 1
+        self._cache = LRUCache(cache_bytes)
+
+    def level_for_scale(self, scale):
+        """
+        :param scale: float number of full resolution pixels covered by one screen pixel
+        :return: integer index of the coarsest level which still has at least one pixel per screen pixel
+        """
+        level = 0
+        while level < self.nlevels - 1 and scale >= 2:
+            scale /= 2.0
+            level += 1
+        return level
+
+    def rect(self, level):
+        """
+        :param level: integer pyramid level
+        :return: tuple (width, height) of the full resolution area covered by an image at this level
+        """
+        ht, wd = self.shape
+        for _ in range(level):
+            ht, wd = ht // 2, wd // 2
+        return wd * 2**level, ht * 2**level
+
+    def get(self, idx, level=0):
+        """
+        :param idx: integer index along the energy axis
+        :param level: integer pyramid level, 0 being full resolution
+        :return: 2d array of the frame at the requested level
+        """
+        if level <= 0:
+            return self.get_frame(idx)
+        img = self._cache.get((idx, level))
+        if img is None:
+            img = self._cache.put((idx, level), downsample(self.get(idx, level - 1)))
+        return img
+
+    def clear(self):
+        """Discard all downsampled images, e.g. after frames of the data set change."""
+        self._cache.clear()
+
+
+def map_LEEM_Data(dirname, ht=0, wd=0, bits=None, byte='L'):
+    """
+    Memory map all .dat files in current data directory without reading them
+    Frames and I(V) curves are read from disk only when accessed
+
+    :argument dirname: string path to current data directory
+    :param ht: integer pixel height of image
+    :param wd: integer pixel width of image
+    :param bits: integer representing bit depth of image, default is 16 bit
+    :param byte: string representing byte order, 'L' for Little-Endian (Intel), 'B' for Big-Endian (Motorola)
+    :return: MappedStack with shape (height, width, number of files)
+    """
+    print('Mapping Data ...')
+    entries = scan_data_files(dirname, '.dat')
+    files = [name for name, size in entries]
+    if not files:
+        print("Error: no .dat files found in {}".format(dirname))
+        return None
+    formatstring = dat_format_string(bits, byte)
+    if formatstring is None:
+        return None
+
+    if ht == 0 and wd == 0:
+        hdln = DEF_IMHEAD
+        ht = DEF_IMHEIGHT
+        wd = DEF_IMWIDTH
+    else:
+        try:
+            hdln = header_length([size for name, size in entries],
+                                 np.dtype(formatstring).itemsize*ht*wd)
+        except ParseError as e:
+            print(e.message)
+            print("Check for correct Image Width, Height and Bit Depth in YAML experiment file")
+            return None
+    print('Calculated Header Length of First File: {}'.format(hdln))
+    return MappedStack([os.path.join(dirname, fl) for fl in files],
+                       ht, wd, hdln, formatstring)
+
+WINDOW_TYPES = ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']
+_windows = {}  # normalized smoothing windows keyed by (window_type, window_len)
+
+
+def get_window(window_type, window_len):
+    """
+    Normalized smoothing window, built once per type and length and then reused
+    :param window_type: string name of window function in WINDOW_TYPES
+    :param window_len: integer size of window
+    :return: read-only 1d numpy array of window weights summing to one
+    """
+    key = (window_type, int(window_len))
+    try:
+        return _windows[key]
+    except KeyError:
+        pass
+    if window_type not in WINDOW_TYPES:
+        raise ValueError("Invalid window type {}".format(window_type))
+    if window_type == 'flat':  # moving average
+        w = np.ones(key[1], 'd')
+    else:
+        w = getattr(np, window_type)(key[1])
+    w = w/w.sum()
+    w.flags.writeable = False
+    _windows[key] = w
+    return w
+
+
+class Smoother(object):
+    """
+    Reusable smoother for single I(V) curves with fixed window settings
+    Gives the same result as smooth() but the window is looked up once and the
+    reflected padding and smoothing are written into work buffers allocated once
+    per curve length, so smoothing the curve under the mouse on every movement
+    does no redundant work. The flat window is a running sum moving average and
+    other windows are a weighted sum of shifted views of the padded curve, as in
+    smooth_cube().
+    """
+
+    def __init__(self, window_len=10, window_type='flat', num=None):
+        """
+        :param window_len: even integer size of window
+        :param window_type: string for type of window function
+        :param num: optional integer number of energies in each curve, to allocate the work buffers now
+        """
+        if not (window_len % 2 == 0):
+            window_len += 1
+            print('Window length supplied is odd - using next highest integer: {}.'.format(window_len))
+        self.window_len = window_len
+        self.window_type = window_type
+        self.valid = window_len > 3 and window_type in WINDOW_TYPES
+        self.window = get_window(window_type, window_len) if self.valid else None
+        # output i of smooth() is the convolution at index start + i of the padded curve
+        self.start = int(window_len/2 - 1) + window_len - 1
+        self.num = None
+        self._padded = None
+        self._work = None  # running sum for the flat window, weighted term for other windows
+        if self.valid and num is not None and num >= window_len:
+            self._allocate(num)
+
+    def _allocate(self, num):
+        self.num = num
+        self._padded = np.empty(num + 2*(self.window_len - 1), dtype=np.float64)
+        if self.window_type == 'flat':
+            self._work = np.zeros(len(self._padded) + 1, dtype=np.float64)
+        else:
+            self._work = np.empty(num, dtype=np.float64)
+
+    def __call__(self, inpt, out=None):
+        """
+        :param inpt: input list or 1d array
+        :param out: optional 1d float array of the same length as inpt to hold the result;
+                    by default a new array is returned since plotted curves keep their data
+        :return out: 1d numpy array of smoothed data with same length as inpt
+        """
+        num = len(inpt)
+        if not self.valid or num < self.window_len:
+            # invalid settings or too short a curve; let smooth() report it
+            return smooth(inpt, window_len=self.window_len, window_type=self.window_type)
+        if num != self.num:
+            self._allocate(num)
+        w = self.window_len
+        s = self._padded
+        s[:w-1] = inpt[w-1:0:-1]
+        s[w-1:w-1+num] = inpt
+        s[w-1+num:] = inpt[-1:-w:-1]
+        if out is None:
+            out = np.empty(num, dtype=np.float64)
+        start = self.start
+        if self.window_type == 'flat':
+            csum = self._work
+            np.cumsum(s, out=csum[1:])
+            np.subtract(csum[start+1:start+1+num], csum[start+1-w:start+1-w+num], out=out)
+            out /= w
+            return out
+        term = self._work
+        np.multiply(s[start:start+num], self.window[0], out=out)
+        for j in range(1, w):
+            np.multiply(s[start-j:start-j+num], self.window[j], out=term)
+            out += term
+        return out
 
-    dat_arr = np.dstack(arr_list)  # create 3D stack of all image files
-    del arr_list[:]  # clear data from list as it ahs now been stored in numpy array
-    # print('Returning New Array Shape: {}'.format(dat_arr.shape))
-    return dat_arr
 
 def smooth(inpt, window_len=10, window_type='flat'):
     """
@@ -133,7 +753,7 @@ def smooth(inpt, window_len=10, window_type='flat'):
         return
 
     # window_type = 'hanning'
-    if not window_type in ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']:
+    if not window_type in WINDOW_TYPES:
         print('Error - Invalid window_type')
         return
 
@@ -143,19 +763,285 @@ def smooth(inpt, window_len=10, window_type='flat'):
     # w is the window matrix based on pre-defined window functions or unit matrix for flat window
 
     s = np.r_[inpt[window_len-1:0:-1], inpt, inpt[-1:-window_len:-1]]
-    # w = eval('np.'+window_type+'(window_len)')
-    if window_type == 'flat':  # moving average
-        w = np.ones(window_len, 'd')
-    else:
-        w = eval('np.'+window_type+'(window_len)')
+    if window_type == 'flat' and len(inpt) >= window_len:
+        # moving average from a running sum; cost does not depend on window_len
+        return moving_average(s, window_len, int(window_len/2 - 1) + window_len - 1, len(inpt))
 
     # create smoothed data via numpy.convolve using the normalized input window matrix
-    otpt = np.convolve(w/w.sum(), s, mode='valid')
+    otpt = np.convolve(get_window(window_type, window_len), s, mode='valid')
 
     # format otpt to be same size as inpt and return
     return otpt[int(window_len/2-1):-int(window_len/2)]
 
 
+def moving_average(s, window_len, start, num):
+    """
+    Mean of window_len consecutive values along the last axis of s computed from a running sum
+    Each output costs two lookups in the cumulative sum regardless of window length.
+    :param s: 1d or nd numpy array; averaged along its last axis
+    :param window_len: integer number of values in each average
+    :param start: integer index in s of the last value in the first window
+    :param num: integer number of averages to compute
+    :return: numpy array of shape s.shape[:-1] + (num,) where
+             output[..., i] = mean(s[..., start+i-window_len+1:start+i+1])
+    """
+    csum = np.zeros(s.shape[:-1] + (s.shape[-1] + 1,), dtype=np.float64)
+    np.cumsum(s, axis=-1, out=csum[..., 1:])
+    hi = csum[..., start+1:start+1+num]
+    lo = csum[..., start+1-window_len:start+1-window_len+num]
+    return (hi - lo) / window_len
+
+
+def fft_convolve(s, w, start, num):
+    """
+    Convolve every row of s with the window w using real FFTs along the last axis
+    :param s: 1d or nd numpy array of signals; convolved along the last axis
+    :param w: 1d numpy array window
+    :param start: integer index of the first value of the full convolution to return
+    :param num: integer number of values to return
+    :return: numpy array of shape s.shape[:-1] + (num,) where
+             output[..., i] = sum_j w[j]*s[..., start+i-j]
+    """
+    nfft = fft_length(s.shape[-1] + len(w) - 1)
+    spec = np.fft.rfft(s, nfft, axis=-1)
+    spec *= np.fft.rfft(w, nfft)
+    return np.fft.irfft(spec, nfft, axis=-1)[..., start:start+num]
+
+
+def fft_length(n):
+    """
+    :param n: integer minimum transform length
+    :return: integer power of two not smaller than n
+    """
+    return 1 << (int(n) - 1).bit_length()
+
+
+FFT_COST_FACTOR = 1.0  # relative cost per element of nfft*log2(nfft) for an FFT convolution vs num*window_len for direct
+
+
+def smooth_method(window_len, num):
+    """
+    Choose the faster way to convolve curves of num energies with a window
+    Direct convolution costs about num*window_len operations per curve while
+    FFT convolution of the padded curve costs about nfft*log2(nfft).
+    :param window_len: even integer size of window
+    :param num: integer number of energies in each curve
+    :return: string 'direct' or 'fft'
+    """
+    nfft = fft_length(num + 3*(window_len - 1))
+    if num*window_len > FFT_COST_FACTOR*nfft*np.log2(nfft):
+        return 'fft'
+    return 'direct'
+
+
+SMOOTH_BLOCK_BYTES = 2*1024**2  # size of padded blocks smoothed at once; small enough to stay in cache
+SMOOTH_TILE = 128  # rows and columns of each tile smoothed by one process in smooth_cube_parallel()
+
+
+def check_smoothing(window_len, window_type, num, method='auto'):
+    """
+    Validate settings for smoothing curves of num energies with smooth_cube()
+    :param window_len: integer size of window; odd lengths are rounded up
+    :param window_type: string for type of window function
+    :param num: integer number of energies in each curve
+    :param method: string smoothing method 'auto', 'direct' or 'fft'
+    :return window_len: even integer size of window, or None if the settings are invalid
+    """
+    if not (window_len % 2 == 0):
+        window_len += 1
+        print('Window length supplied is odd - using next highest integer: {}.'.format(window_len))
+
+    if window_len <= 3:
+        print('Error in data smoothing - please select a larger window length')
+        return
+
+    if not window_type in WINDOW_TYPES:
+        print('Error - Invalid window_type')
+        return
+
+    if method not in ['auto', 'direct', 'fft']:
+        print('Error - Invalid smoothing method')
+        return
+
+    if num < window_len:
+        print('Error in data smoothing - window length must not exceed the number of energies')
+        return
+    return window_len
+
+
+def smooth_cube(data, window_len=10, window_type='flat', chunk_rows=None, out=None, method='auto'):
+    """
+    Smooth every I(V) curve of a 3d data set along the energy axis
+    Gives the same result as applying smooth() to each curve, but the reflective
+    padding and window convolution are done for a block of rows of the data set
+    at once with one array operation per window element, rather than with a
+    python function call per pixel. The flat window is a moving average
+    computed from a running sum whose cost does not depend on window length.
+    Other windows are convolved directly or, for long windows and long energy
+    sweeps, with batched FFTs when smooth_method() estimates that is faster.
+
+    :param data: 3d numpy array or array-like (row, col, energy)
+    :param window_len: even integer size of window
+    :param window_type: string for type of window function
+    :param chunk_rows: integer number of image rows smoothed at once, default sized by SMOOTH_BLOCK_BYTES
+    :param out: optional 3d float array of the same shape as data to hold the result
+    :param method: string 'auto' to pick the fastest method, 'direct' for a weighted sum
+                   of shifted curves or 'fft' for FFT convolution
+    :return out: 3d numpy array of smoothed data, or None if the settings are invalid
+    """
+    ht, wd, num = data.shape
+    window_len = check_smoothing(window_len, window_type, num, method)
+    if window_len is None:
+        return
+    w = get_window(window_type, window_len)
+
+    if method == 'auto':
+        # the running sum is cheapest for the flat window
+        method = 'flat' if window_type == 'flat' else smooth_method(window_len, num)
+    if chunk_rows is None:
+        chunk_rows = max(1, SMOOTH_BLOCK_BYTES // (8*wd*(num + 2*window_len)))
+    if out is None:
+        out = np.empty((ht, wd, num), dtype=np.float64)
+    # smooth() keeps convolution outputs [window_len/2 - 1, window_len/2 - 1 + num)
+    # of the reflected signal; output i is sum_j w[j]*s[i + window_len-1 - j]
+    start = int(window_len/2 - 1) + window_len - 1
+    for r0 in range(0, ht, chunk_rows):
+        block = np.asarray(data[r0:r0+chunk_rows], dtype=np.float64)
+        # same reflections as smooth(), taken along the energy axis
+        s = np.concatenate((block[..., window_len-1:0:-1], block, block[..., -1:-window_len:-1]), axis=2)
+        acc = out[r0:r0+chunk_rows]
+        if method == 'flat':
+            # running sum moving average; cost does not depend on window_len
+            acc[...] = moving_average(s, window_len, start, num)
+            continue
+        if method == 'fft':
+            acc[...] = fft_convolve(s, w, start, num)
+            continue
+        np.multiply(s[..., start:start+num], w[0], out=acc)
+        for j in range(1, window_len):
+            acc += w[j] * s[..., start-j:start-j+num]
+    return out
+
+
+def smooth_cube_parallel(data, window_len=10, window_type='flat', workers=None, tile=SMOOTH_TILE,
+                         callback=None, cancel=None, method='auto', dtype=np.float64, out=None):
+    """
+    Smooth every I(V) curve of a 3d data set using a pool of processes
+    The data set is copied once into a shared memory block and split into
+    spatial tiles of tile x tile pixels. Each process attaches to the shared
+    blocks by name and smooths a tile with smooth_cube() into one of a few
+    shared output slots, so the data set itself is never pickled and sent
+    between processes. Finished tiles are copied from their slot into the
+    output array as they complete and the slot is reused for the next tile,
+    so the shared output needs only a few tiles of memory.
+    Requires Python 3.8+ for multiprocessing.shared_memory.
+
+    :param data: 3d numpy array or array-like (row, col, energy)
+    :param window_len: even integer size of window
+    :param window_type: string for type of window function
+    :param workers: integer number of processes, default os.cpu_count()
+    :param tile: integer number of rows and columns in each tile
+    :param callback: optional callable(count, total) called as each tile is completed
+    :param cancel: optional callable returning True when smoothing should be abandoned
+    :param method: string 'auto', 'direct' or 'fft'; see smooth_cube()
+    :param dtype: numpy floating point type of the smoothed data, float32 or float64
+    :param out: optional 3d array of the same shape as data to hold the result
+    :return out: 3d numpy array of smoothed data, or None if the settings are invalid or cancelled
+    """
+    from multiprocessing import shared_memory
+
+    ht, wd, num = data.shape
+    window_len = check_smoothing(window_len, window_type, num, method)
+    if window_len is None:
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    in_dtype = np.dtype(data.dtype)
+    out_dtype = np.dtype(dtype)
+    shape = (ht, wd, num)
+    tiles = [(r0, min(r0 + tile, ht), c0, min(c0 + tile, wd))
+             for r0 in range(0, ht, tile) for c0 in range(0, wd, tile)]
+    # two slots per process so a process never waits for its last tile to be copied out
+    slot_shape = (min(len(tiles), 2*workers), min(tile, ht), min(tile, wd), num)
+    if out is None:
+        out = np.empty(shape, dtype=out_dtype)
+    print('Smoothing {0} tiles using {1} processes ...'.format(len(tiles), workers))
+
+    shm_in = shared_memory.SharedMemory(create=True, size=max(1, ht*wd*num*in_dtype.itemsize))
+    shm_out = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(slot_shape))*out_dtype.itemsize))
+    inp = slots = None
+    try:
+        inp = np.ndarray(shape, dtype=in_dtype, buffer=shm_in.buf)
+        # pixel-major copy so each tile's curves are contiguous; read a block
+        # of energies at a time so lazily loaded stacks are never fully resident
+        for e0 in range(0, num, 64):
+            inp[:, :, e0:e0+64] = data[:, :, e0:e0+64]
+        inp = None
+        slots = np.ndarray(slot_shape, dtype=out_dtype, buffer=shm_out.buf)
+
+        remaining = iter(tiles)
+        pending = {}
+        count = 0
+        cancelled = False
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            def submit(slot):
+                bounds = next(remaining, None)
+                if bounds is not None:
+                    future = pool.submit(_smooth_tile, shm_in.name, shm_out.name, shape, in_dtype.str,
+                                         slot_shape, out_dtype.str, slot, bounds,
+                                         window_len, window_type, method)
+                    pending[future] = (slot, bounds)
+
+            for slot in range(slot_shape[0]):
+                submit(slot)
+            while pending and not cancelled:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    slot, (r0, r1, c0, c1) = pending.pop(future)
+                    future.result()
+                    out[r0:r1, c0:c1] = slots[slot, :r1-r0, :c1-c0]
+                    count += 1
+                    if callback is not None:
+                        callback(count, len(tiles))
+                    if cancel is not None and cancel():
+                        cancelled = True
+                        break
+                    submit(slot)
+            for future in pending:
+                future.cancel()
+        if cancelled:
+            print('Smoothing cancelled after {0} of {1} tiles'.format(count, len(tiles)))
+            return None
+        return out
+    finally:
+        inp = slots = None  # views must be released before the shared blocks are closed
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
+
+
+def _smooth_tile(in_name, out_name, shape, in_dtype, slot_shape, out_dtype, slot, bounds,
+                 window_len, window_type, method):
+    """Smooth one tile of the shared input block into a slot of the shared output block."""
+    from multiprocessing import shared_memory
+
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        inp = np.ndarray(shape, dtype=in_dtype, buffer=shm_in.buf)
+        slots = np.ndarray(slot_shape, dtype=out_dtype, buffer=shm_out.buf)
+        r0, r1, c0, c1 = bounds
+        smooth_cube(inp[r0:r1, c0:c1], window_len=window_len, window_type=window_type,
+                    out=slots[slot, :r1-r0, :c1-c0], method=method)
+        del inp, slots
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return bounds
+
+
 def crop_images(data, indices):
     """
     Crop images based on the indices specified
@@ -167,14 +1053,58 @@ def crop_images(data, indices):
                 indices[0][1]:indices[1][1]+1]
 
 
-def get_img_array(path, ext=None, swap=False):
+def integrate_windows(data, windows, block=64):
+    """
+    Sum the intensity inside rectangular integration windows at each energy
+    Data is read one block of energies at a time and only the rows and columns
+    inside each window are requested, so memory mapped or chunked data sets
+    never need to be fully resident in memory.
+
+    :param data: 3d numpy array or array-like (row, col, energy)
+    :param windows: list of tuples (r0, r1, c0, c1) of window bounds; r1 and c1 are exclusive
+    :param block: integer number of energies read at once
+    :return: list of 1d numpy arrays of integrated intensity, one per window
+    """
+    ht, wd, num = data.shape
+    # windows extending past the edge of the image are clipped to the image
+    windows = [(max(r0, 0), min(r1, ht), max(c0, 0), min(c1, wd)) for r0, r1, c0, c1 in windows]
+    blocks = [[] for _ in windows]
+    for e0 in range(0, num, block):
+        for idx, (r0, r1, c0, c1) in enumerate(windows):
+            window = np.asarray(data[r0:r1, c0:c1, e0:e0+block])
+            blocks[idx].append(window.sum(axis=(0, 1)))
+    return [np.concatenate(blk) for blk in blocks]
+
+
+def integrate_window(data, r0, r1, c0, c1, block=64):
+    """
+    :param data: 3d numpy array or array-like (row, col, energy)
+    :param r0: integer first row of window
+    :param r1: integer row past the end of window
+    :param c0: integer first column of window
+    :param c1: integer column past the end of window
+    :param block: integer number of energies read at once
+    :return: 1d numpy array of intensity summed over the window at each energy
+    """
+    return integrate_windows(data, [(r0, r1, c0, c1)], block=block)[0]
+
+
+def get_img_array(path, ext=None, swap=False, workers=None, callback=None):
     """
     Generate a 3d numpy array of gray-scale image files
-    :param path: path to image files
+    A multi-page TIFF file, given either as path or as the only image in the
+    directory, is returned as a lazily decoded TiffStack instead.
+    :param path: path to image files or to a multi-page TIFF file
     :param ext: file extension, default None for raw (.dat) data (not yet implemented)
     :param swap: boolean to swap the byte order of the array; default False
+    :param workers: integer number of processes used to decode images, default None decodes serially
+    :param callback: optional callable(dat_3d, count) called as each image is decoded in order;
+                     images [0, count) of dat_3d are complete
     :return dat_3d: 3d numpy array (height, width, image number)
     """
+    if os.path.isfile(path):
+        print('Indexing multi-page TIFF file: {}'.format(path))
+        return TiffStack(path, workers=workers)
     if ext is None:
         # Raw Data - implement this later
         pass
@@ -211,13 +1141,90 @@ def get_img_array(path, ext=None, swap=False):
         # at this point we have found a list of files to parse
         print("Found {} data files to parse.".format(len(files)))
         files.sort()
-        arr_list = []
-        for fl in files:
-            arr_list.append(read_img(os.path.join(path, fl)))
+        if len(files) == 1 and files[0].lower().endswith(('.tif', '.tiff')):
+            # the whole I(V) series may be stored as pages of one file
+            stack = TiffStack(os.path.join(path, files[0]), workers=workers)
+            if stack.shape[2] > 1:
+                return stack
+        if workers is not None and workers > 1:
+            dat_3d = read_img_parallel([os.path.join(path, fl) for fl in files],
+                                       workers=workers, callback=callback)
+            if swap:
+                dat_3d.byteswap(inplace=True)
+            return dat_3d
+        dat_3d = None
+        for idx, fl in enumerate(files):
+            img = decode_img(os.path.join(path, fl))
+            if dat_3d is None:
+                # size the output from the geometry of the first image
+                dat_3d = np.empty((len(files),) + img.shape, dtype=img.dtype.newbyteorder('='))
+            elif not np.can_cast(img.dtype, dat_3d.dtype):
+                # images in one directory are not guaranteed to share a pixel mode
+                dat_3d = dat_3d.astype(np.promote_types(img.dtype, dat_3d.dtype))
+            dat_3d[idx] = img
+            if callback is not None:
+                callback(dat_3d.transpose(1, 2, 0), idx + 1)
         if swap:
-            return np.dstack(arr_list).byteswap()
-        else:
-            return np.dstack(arr_list)
+            dat_3d.byteswap(inplace=True)
+        # (height, width, image number) view of the energy-major data
+        return dat_3d.transpose(1, 2, 0)
+
+
+# Pillow image modes which are copied into numpy at their native bit depth
+# any other mode (RGB, palette, etc.) is converted to 8 bit greyscale
+IMG_MODE_DTYPES = {'L': 'u1',
+                   'I;16': '<u2',
+                   'I;16L': '<u2',
+                   'I;16B': '>u2',
+                   'I;16N': '=u2',
+                   'I': '=i4',
+                   'F': '=f4'}
+
+
+def decode_img(path):
+    """
+    Use PIL to decode an image file directly into a 2D numpy array at its native bit depth.
+    16 bit greyscale TIFF and PNG images keep their full dynamic range.
+    Colour images are converted to greyscale as in read_img().
+    Pixel data is copied as one buffer; there is no per-pixel work in python.
+    Uncompressed greyscale TIFF files are read directly from the location given
+    in their image file directory without going through PIL.
+    :param path: path to image to be opened
+    :return: 2d numpy array (height, width)
+    """
+    if path.lower().endswith(('.tif', '.tiff')):
+        try:
+            img = read_tiff(path)
+        except ParseError:
+            img = None  # let PIL report or handle anything unusual
+        if img is not None:
+            return img
+    return pil_to_array(Image.open(path))
+
+
+def decode_tiff_page(path, idx):
+    """
+    Use PIL to decode a single page of a multi-page TIFF file
+    :param path: string path to TIFF file
+    :param idx: integer page number
+    :return: 2d numpy array (height, width)
+    """
+    im = Image.open(path)
+    im.seek(idx)
+    return pil_to_array(im)
+
+
+def pil_to_array(im):
+    """
+    Copy a PIL image into a 2D numpy array at its native bit depth
+    :param im: PIL Image
+    :return: 2d numpy array (height, width)
+    """
+    if im.mode not in IMG_MODE_DTYPES:
+        # ITU-R 601-2 luma transform, see read_img()
+        im = im.convert('L')
+    w, h = im.size
+    return np.frombuffer(im.tobytes(), dtype=IMG_MODE_DTYPES[im.mode]).reshape((h, w))
 
 
 def read_img(path):
@@ -225,6 +1232,7 @@ def read_img(path):
         Use PIL to open an image file, convert to greyscale and output a 2D numpy array.
         In principle should work for .tif, .png, .jpg,
         and possibly anything else supported by Image.open().
+        Deprecated: this reduces every image to 8 bits and is slow; use decode_img()
         :param path: path to image to be opened
         :return:
         """
@@ -263,52 +1271,456 @@ def read_img(path):
             raise e
 
 
+def read_img_parallel(paths, workers=4, callback=None):
+    """
+    Decode a list of image files concurrently using a pool of processes
+    Image decoding in Pillow holds the GIL so separate processes are used.
+    Frames are written into their slot of a preallocated 3d array in file order.
+
+    :param paths: list of string paths to image files in energy order
+    :param workers: integer number of decoding processes
+    :param callback: optional callable(dat_3d, count) called as images complete in order
+    :return dat_3d: 3d numpy array (height, width, image number)
+    """
+    print('Decoding {0} images using {1} processes ...'.format(len(paths), workers))
+    dat_3d = None
+    chunksize = max(1, len(paths) // (4*workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for idx, frame in enumerate(pool.map(decode_img, paths, chunksize=chunksize)):
+            if dat_3d is None:
+                # size the output from the geometry of the first image
+                dat_3d = np.empty((len(paths),) + frame.shape, dtype=frame.dtype.newbyteorder('='))
+            elif not np.can_cast(frame.dtype, dat_3d.dtype):
+                # images in one directory are not guaranteed to share a pixel mode
+                dat_3d = dat_3d.astype(np.promote_types(frame.dtype, dat_3d.dtype))
+            dat_3d[idx] = frame
+            if callback is not None:
+                callback(dat_3d.transpose(1, 2, 0), idx + 1)
+    return dat_3d.transpose(1, 2, 0)
+
+
+# TIFF tags needed to locate pixel data
+TIFF_TAGS = {256: 'width',
+             257: 'height',
+             258: 'bits',
+             259: 'compression',
+             262: 'photometric',
+             273: 'offsets',
+             277: 'samples',
+             278: 'rows_per_strip',
+             279: 'counts',
+             284: 'planar',
+             322: 'tile_width',
+             323: 'tile_height',
+             324: 'offsets',
+             325: 'counts',
+             339: 'sample_format'}
+# TIFF field types holding unsigned integers: type code -> struct format character
+TIFF_INT_TYPES = {1: 'B', 3: 'H', 4: 'I', 16: 'Q'}
+
+
+def read_tiff_ifd(f, offset, bo, big=False):
+    """
+    Read a single TIFF image file directory (IFD)
+    Only the directory entries and any out of line values of the tags in
+    TIFF_TAGS are read; pixel data is never touched.
+
+    :param f: file object opened in binary mode
+    :param offset: integer byte offset of the IFD
+    :param bo: string struct byte order character, '<' or '>'
+    :param big: boolean True for BigTIFF files with 64 bit offsets
+    :return: tuple (dictionary of tag name -> tuple of values, integer offset of next IFD or 0)
+    """
+    if big:
+        countfmt, entryfmt, entrysize, inline = 'Q', 'HHQ', 20, 8
+    else:
+        countfmt, entryfmt, entrysize, inline = 'H', 'HHI', 12, 4
+    f.seek(offset)
+    head = f.read(struct.calcsize(countfmt))
+    if len(head) != struct.calcsize(countfmt):
+        raise ParseError(message="TIFF directory at offset {} is past the end of the file.".format(offset),
+                         errors=None)
+    nentries = struct.unpack(bo + countfmt, head)[0]
+    raw = f.read(nentries*entrysize + inline)
+    if len(raw) != nentries*entrysize + inline:
+        raise ParseError(message="TIFF directory at offset {} is truncated.".format(offset), errors=None)
+    tags = {}
+    for idx in range(nentries):
+        entry = raw[idx*entrysize:(idx+1)*entrysize]
+        code, ftype, count = struct.unpack(bo + entryfmt, entry[:struct.calcsize(entryfmt)])
+        if code not in TIFF_TAGS or ftype not in TIFF_INT_TYPES:
+            continue
+        fmt = bo + str(count) + TIFF_INT_TYPES[ftype]
+        size = struct.calcsize(fmt)
+        value = entry[entrysize-inline:]
+        if size > inline:
+            # value does not fit in the entry; it is stored at the given offset
+            pos = f.tell()
+            f.seek(struct.unpack(bo + ('Q' if big else 'I'), value)[0])
+            value = f.read(size)
+            f.seek(pos)
+            if len(value) != size:
+                raise ParseError(message="Values of TIFF tag {0} in directory at offset {1} are truncated.".format(
+                                     code, offset), errors=None)
+        tags[TIFF_TAGS[code]] = struct.unpack(fmt, value[:size])
+    nextifd = struct.unpack(bo + ('Q' if big else 'I'), raw[nentries*entrysize:])[0]
+    return tags, nextifd
+
+
+def parse_tiff(path, pages=1):
+    """
+    Parse the image file directories of a TIFF file
+    :param path: string path to TIFF file
+    :param pages: integer maximum number of pages to parse; None parses every page
+    :return: list of dictionaries, one per page, with keys:
+             byte_order ('<' or '>'), width, height, bits, samples, sample_format,
+             compression, photometric, planar, tiled, offsets and counts of each strip
+             or tile, rows_per_strip, tile_width and tile_height
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ParseError(message="File {} is too short to be a TIFF file.".format(path), errors=None)
+        if head[:2] == b'II':
+            bo = '<'
+        elif head[:2] == b'MM':
+            bo = '>'
+        else:
+            raise ParseError(message="Unknown byte order in first two bytes of TIFF file.",
+                             errors={'byte_order': head[:2]})
+        version = struct.unpack(bo + 'H', head[2:4])[0]
+        if version == 42:
+            big = False
+            offset = struct.unpack(bo + 'I', head[4:8])[0]
+        elif version == 43:
+            big = True
+            head = f.read(8)
+            if len(head) < 8:
+                raise ParseError(message="File {} is too short to be a BigTIFF file.".format(path), errors=None)
+            offset = struct.unpack(bo + 'Q', head)[0]
+        else:
+            raise ParseError(message="File {} is not a TIFF file.".format(path), errors={'version': version})
+
+        info = []
+        seen = set()
+        while offset and (pages is None or len(info) < pages):
+            if offset in seen:
+                break  # malformed file with a loop of directories
+            seen.add(offset)
+            tags, offset = read_tiff_ifd(f, offset, bo, big)
+            if 'width' not in tags or 'height' not in tags or 'offsets' not in tags:
+                raise ParseError(message="TIFF directory in {} is missing required tags.".format(path),
+                                 errors={'tags': sorted(tags)})
+            height = tags['height'][0]
+            info.append({'byte_order': bo,
+                         'width': tags['width'][0],
+                         'height': height,
+                         'bits': tags.get('bits', (1,))[0],
+                         'samples': tags.get('samples', (1,))[0],
+                         'sample_format': tags.get('sample_format', (1,))[0],
+                         'compression': tags.get('compression', (1,))[0],
+                         # PIL treats a missing PhotometricInterpretation as WhiteIsZero
+                         'photometric': tags.get('photometric', (0,))[0],
+                         'planar': tags.get('planar', (1,))[0],
+                         'tiled': 'tile_width' in tags,
+                         'offsets': tags['offsets'],
+                         'counts': tags.get('counts'),
+                         'rows_per_strip': tags.get('rows_per_strip', (height,))[0],
+                         'tile_width': tags.get('tile_width', (0,))[0],
+                         'tile_height': tags.get('tile_height', (0,))[0]})
+    if not info:
+        # libtiff leaves the first IFD offset at 0 until the file has been written
+        raise ParseError(message="TIFF file {} has no image file directory.".format(path), errors=None)
+    return info
+
+
+def tiff_dtype(info):
+    """
+    :param info: dictionary describing one TIFF page from parse_tiff()
+    :return: numpy dtype of the pixels in the page, or None if not a supported greyscale format
+    """
+    kinds = {1: 'u', 2: 'i', 3: 'f'}
+    if info['samples'] != 1 or info['sample_format'] not in kinds or info['bits'] not in (8, 16, 32, 64):
+        return None
+    return np.dtype(info['byte_order'] + kinds[info['sample_format']] + str(info['bits'] // 8))
+
+
+def tiff_data_offset(info, black_is_zero=True):
+    """
+    Locate the pixel data of a TIFF page which can be read in place without decoding
+    Pixel data must be uncompressed, greyscale with zero as black (BlackIsZero) and
+    stored in strips which are contiguous in the file. Palette, WhiteIsZero and other
+    photometric interpretations are left to PIL to convert.
+    :param info: dictionary describing one TIFF page from parse_tiff()
+    :param black_is_zero: boolean False to locate stored values of any photometric interpretation
+    :return: integer byte offset of the pixel data, or None if the page must be decoded
+    """
+    dtype = tiff_dtype(info)
+    if dtype is None or info['compression'] != 1 or info['tiled'] or info['counts'] is None:
+        return None
+    if black_is_zero and info['photometric'] != 1:
+        return None
+    offsets, counts = info['offsets'], info['counts']
+    for idx in range(1, len(offsets)):
+        if offsets[idx] != offsets[idx-1] + counts[idx-1]:
+            return None
+    if sum(counts) < info['width']*info['height']*dtype.itemsize:
+        return None
+    return offsets[0]
+
+
+def read_tiff(path, info=None):
+    """
+    Read the pixel data of an uncompressed TIFF page directly, without decoding through PIL
+    :param path: string path to TIFF file
+    :param info: dictionary describing the page from parse_tiff(); default reads the first page
+    :return: 2d numpy array (height, width), or None if the page must be decoded with decode_img()
+    """
+    if info is None:
+        info = parse_tiff(path)[0]
+    offset = tiff_data_offset(info)
+    if offset is None:
+        return None
+    out = np.empty((info['height'], info['width']), dtype=tiff_dtype(info))
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        nread = f.readinto(out)
+    if nread != out.nbytes:
+        raise IOError("File {0} is too short: read {1} of {2} bytes.".format(path, nread, out.nbytes))
+    return out
+
+
+def map_tiff(path, info=None):
+    """
+    Memory map the pixel data of an uncompressed TIFF page in place
+    :param path: string path to TIFF file
+    :param info: dictionary describing the page from parse_tiff(); default maps the first page
+    :return: 2d numpy memmap (height, width), or None if the page must be decoded with decode_img()
+    """
+    if info is None:
+        info = parse_tiff(path)[0]
+    offset = tiff_data_offset(info)
+    if offset is None:
+        return None
+    return np.memmap(path, dtype=tiff_dtype(info), mode='r', offset=offset,
+                     shape=(info['height'], info['width']))
+
+
+def map_tiff_stack(path, ext='.tif'):
+    """
+    Memory map a directory of uncompressed TIFF files
+    All files must share the same geometry, pixel format and pixel data offset,
+    as is the case for a series of images written by the same camera.
+
+    :param path: string path to directory of TIFF files, or to a single multi-page TIFF file
+    :param ext: string file extension, '.tif' or '.tiff'
+    :return: MappedStack with shape (height, width, number of files), TiffStack for a multi-page file,
+             or None if any file must be decoded
+    """
+    if os.path.isfile(path):
+        return TiffStack(path)
+    files = [name for name, size in scan_data_files(path, ext)]
+    if not files:
+        # get_img_array() also accepts the alternate tiff extension
+        files = [name for name, size in scan_data_files(path, '.tiff' if ext == '.tif' else '.tif')]
+    if not files:
+        print("Error: no TIFF files found in {}".format(path))
+        return None
+    layout = None
+    for fl in files:
+        try:
+            info = parse_tiff(os.path.join(path, fl))[0]
+        except ParseError as e:
+            print(e.message)
+            return None
+        current = (info['height'], info['width'], tiff_dtype(info), tiff_data_offset(info))
+        if current[3] is None or (layout is not None and current != layout):
+            print("TIFF file {} cannot be memory mapped; decoding images instead.".format(fl))
+            return None
+        layout = current
+    ht, wd, dtype, offset = layout
+    return MappedStack([os.path.join(path, fl) for fl in files], ht, wd, offset, dtype)
+
+
+class DecodedStack(LazyStack):
+    """
+    Stack of frames which must be decoded before use, e.g. compressed images
+    Frames are decoded when first accessed, in parallel when several are
+    requested at once, and kept in a bounded LRU cache.
+    Sub-classes implement decoder(idx) returning a picklable function and its
+    arguments, and may override get_frame() for frames which need no decoding.
+    """
+
+    def __init__(self, shape, dtype, workers=None, cache_bytes=256*1024**2):
+        """
+        :param shape: tuple (height, width, number of frames)
+        :param dtype: numpy dtype of decoded frames
+        :param workers: integer number of processes used to decode frames, default None decodes serially
+        :param cache_bytes: integer maximum size in bytes of decoded frames kept in memory
+        """
+        super(DecodedStack, self).__init__(shape, dtype)
+        self.workers = workers
+        self._cache = LRUCache(cache_bytes)
+        self._lock = threading.Lock()  # protects the decoding pool and other state shared between readers
+        self._pool = None  # decoding processes, started on first use
+
+    def close(self):
+        """Shut down any decoding processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def decoder(self, idx):
+        """
+        :param idx: integer index along the energy axis
+        :return: tuple (function, argument tuple) which decodes the frame, or None if no decoding is needed
+        """
+        raise NotImplementedError
+
+    def get_frame(self, idx):
+        frame = self._cache.get(idx)
+        if frame is None:
+            func, args = self.decoder(idx)
+            frame = self._cache.put(idx, func(*args))
+        return frame
+
+    def get_frames(self, indices):
+        # frames not yet decoded, in order of first appearance
+        missing = list(OrderedDict.fromkeys(idx for idx in indices
+                                            if idx not in self._cache and self.decoder(idx) is not None))
+        if self.workers is None or self.workers < 2 or len(missing) < 2:
+            for idx in indices:
+                yield self.get_frame(idx)
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            pool = self._pool
+        # decoded frames are consumed in order as they arrive rather than cached
+        # first, so requests larger than the cache do not evict their own frames
+        chunksize = max(1, len(missing) // (4*self.workers))
+        calls = [self.decoder(idx) for idx in missing]
+        decoded = pool.map(_call, [func for func, args in calls], [args for func, args in calls],
+                                 chunksize=chunksize)
+        nextmissing = 0
+        for idx in indices:
+            if nextmissing < len(missing) and idx == missing[nextmissing]:
+                nextmissing += 1
+                yield self._cache.put(idx, next(decoded))
+            else:
+                yield self.get_frame(idx)
+
+
+def _call(func, args):
+    """Call func(*args); used to send decoding calls to a process pool."""
+    return func(*args)
+
+
+class TiffStack(DecodedStack):
+    """
+    Stack of the pages of a single multi-page TIFF file
+    The image file directories of all pages are indexed once when the stack is
+    created. Uncompressed pages are memory mapped in place; compressed pages are
+    decoded with PIL when first accessed.
+    """
+
+    def __init__(self, path, workers=None, cache_bytes=256*1024**2):
+        """
+        :param path: string path to multi-page TIFF file
+        :param workers: integer number of processes used to decode compressed pages, default None decodes serially
+        :param cache_bytes: integer maximum size in bytes of decoded pages kept in memory
+        """
+        self.path = path
+        self.pages = parse_tiff(path, pages=None)
+        ht, wd = self.pages[0]['height'], self.pages[0]['width']
+        for idx, info in enumerate(self.pages):
+            if (info['height'], info['width']) != (ht, wd):
+                raise ParseError(message="Page {0} of {1} is {2}x{3}; all pages must be {4}x{5}.".format(
+                                     idx, path, info['width'], info['height'], wd, ht),
+                                 errors={'page': idx})
+        self.offsets = [tiff_data_offset(info) for info in self.pages]
+        dtype = tiff_dtype(self.pages[0])
+        if dtype is None or self.offsets[0] is None:
+            dtype = decode_tiff_page(path, 0).dtype
+        super(TiffStack, self).__init__((ht, wd, len(self.pages)), dtype.newbyteorder('='),
+                                        workers=workers, cache_bytes=cache_bytes)
+        print("Indexed {0} pages of {1}; {2} are compressed.".format(
+            len(self.pages), path, sum(offset is None for offset in self.offsets)))
+        self._raw = None  # byte memmap of the whole file, opened on first use
+
+    def decoder(self, idx):
+        if self.offsets[idx] is not None:
+            return None
+        return decode_tiff_page, (self.path, idx)
+
+    def get_frame(self, idx):
+        if self.offsets[idx] is None:
+            return super(TiffStack, self).get_frame(idx)
+        with self._lock:
+            if self._raw is None:
+                self._raw = np.memmap(self.path, dtype=np.uint8, mode='r')
+        info = self.pages[idx]
+        dtype = tiff_dtype(info)
+        nbytes = info['height']*info['width']*dtype.itemsize
+        raw = self._raw[self.offsets[idx]:self.offsets[idx]+nbytes]
+        return raw.view(dtype).reshape((info['height'], info['width']))
+
+
+class ImageStack(DecodedStack):
+    """
+    Stack of image files, one per energy, decoded only when accessed
+    The geometry and pixel format of the stack are taken from the first image.
+    """
+
+    def __init__(self, paths, workers=None, cache_bytes=256*1024**2):
+        """
+        :param paths: list of string paths to image files in energy order
+        :param workers: integer number of processes used to decode images, default None decodes serially
+        :param cache_bytes: integer maximum size in bytes of decoded images kept in memory
+        """
+        self.paths = paths
+        first = decode_img(paths[0])
+        super(ImageStack, self).__init__(first.shape + (len(paths),), first.dtype.newbyteorder('='),
+                                         workers=workers, cache_bytes=cache_bytes)
+        self._cache.put(0, first)
+
+    def decoder(self, idx):
+        return decode_img, (self.paths[idx],)
+
+
+def image_stack(path, ext, workers=None):
+    """
+    Open a directory of image files as a lazily decoded stack
+    :param path: string path to directory of image files
+    :param ext: string file extension
+    :param workers: integer number of processes used to decode images
+    :return: ImageStack with shape (height, width, number of files), or None if no files are found
+    """
+    files = [name for name, size in scan_data_files(path, ext)]
+    if not files and ext in ['.tif', '.tiff']:
+        files = [name for name, size in scan_data_files(path, '.tiff' if ext == '.tif' else '.tif')]
+    if not files:
+        print("Error: no {0} files found in {1}".format(ext, path))
+        return None
+    return ImageStack([os.path.join(path, fl) for fl in files], workers=workers)
+
+
 def parse_tiff_header(img, w, h, byte_depth):
     """
-    try to find byte order in tiff header info
+    Find byte order of a tiff file from its image file directory
     :param img: string path to file to examine
     :param w: img width
     :param h: imh height
-    :param byte_depth: number of bits per pixel
-    :return: string corresponding to Experiment YAML settings for byte order: 'L' or 'B' or None if error
+    :param byte_depth: number of bytes per pixel
+    :return: string corresponding to Experiment YAML settings for byte order: 'L' or 'B'
     """
-    header_data = None
-    header = None
-    try:
-        with open(img, 'rb') as f:
-            header = len(f.read()) - byte_depth*w*h
-            if header < 0:
-                raise ParseError(message="Incorrect value calculated for header length; \
-                                          Check for correct Image Width, Height and Bit Depth.", errors=None)
-
-            f.seek(0)
-            header_data = f.read()[0:header+1]
-            f.seek(0)
-            data = f.read()[header:]
-
-    except FileNotFoundError:
-        print("Error: File {0} not found in current directory.".format(img))
-
-    if not header_data:
-        raise ParseError(message="No Header Information Found; Check for correct Image Width, Height and Bit Depth", errors=None)
-    # TODO: the decoding of bytes using UTF-8 could be troublesome in the future ...
-    # Perhaps its best here to have some sort of User configurable data encoding setting
-    # For now that is beyond the scope of the current development
-    if len(header_data) >= 2:
-        byte_order = header_data[0:2]
-        if byte_order.decode("UTF-8") == "MM":
-            # in py2.7 'MM'.decode("UTF-8") returns u'MM' which compares True to 'MM'
-            # in py3, byte_order will be read as b'MM' which needs to be decoded before comparison
-            return 'B'
-        elif byte_order.decode("UTF-8") == "II":
-            # in py2.7 'II'.decode("UTF-8") returns u'MM' which compares True to 'II'
-            # in py3, byte_order will be read as b'MM' which needs to be decoded before comparison
-            return 'L'
-        else:
-            raise ParseError(message="Unknown byte order in first two bytes of TIFF file.", errors={byte_order: byte_order})
-
-    else:
-        raise ParseError(message="Header Length too short; Need at least two bytes to read correct byte order.", errors=None)
+    info = parse_tiff(img)[0]
+    if (info['width'], info['height'], info['bits']) != (w, h, 8*byte_depth):
+        raise ParseError(message="TIFF image is {0}x{1} at {2} bits; Check for correct Image Width, Height "
+                                 "and Bit Depth.".format(info['width'], info['height'], info['bits']),
+                         errors={'info': info})
+    return 'L' if info['byte_order'] == '<' else 'B'
 
 
 def gen_dat_files(dirname=None, outdirname=None, ext=None,
@@ -328,7 +1740,8 @@ def gen_dat_files(dirname=None, outdirname=None, ext=None,
               image width, image height, and image byte_depth.")
         return
     print('Searching for files in {0} ...'.format(dirname))
-    files = [name for name in os.listdir(dirname) if name.endswith(ext)]
+    entries = scan_data_files(dirname, ext)
+    files = [name for name, size in entries]
 
     if not files:
         print("Error: no files found with file extension {0}".format(ext))
@@ -358,19 +1771,180 @@ def gen_dat_files(dirname=None, outdirname=None, ext=None,
     elif byte_order == 'B':
         byte_order = '>'
 
-    for file in files:
-        with open(os.path.join(dirname, file), 'rb') as f:
-            header = len(f.read()) - byte_depth * w * h
-            f.seek(0)
-            # generate numpy friendly data format string: ex. '<u2' = little endian, unsigned integer, 2 bytes per pixel
-            fmtstr = byte_order + 'u' + str(byte_depth)
-            data = np.fromstring(f.read()[header:], fmtstr).reshape((h,w))  # strip header information
-            with open(os.path.join(outdirname, file.split('.')[0]+'.dat'), 'wb') as o:
-                data.tofile(o)  # store image data as raw binary file
+    payload = byte_depth * w * h
+    try:
+        header = dat_header(dirname, files, payload)
+    except ParseError as e:
+        print("Error: " + e.message)
+        return
+    # pixel data is copied verbatim so the output keeps the byte order of the input files
+    print('Image data is stored {} endian'.format('little' if byte_order == '<' else 'big'))
+    convert_to_dat(dirname, outdirname, files, header, payload)
     print("Done outputting dat files ...")
     return
 
 
+def dat_header(dirname, files, payload):
+    """
+    Header length to strip from each input file when converting to raw .dat files
+    TIFF files written by a camera may carry tags of varying length, so their
+    sizes differ and their pixel data need not be at the end of the file. For
+    TIFF input None is returned and convert_dat_file() reads the pixel data
+    offset of each file from its own image file directory. Other files must all
+    share the same size and the header length is calculated from it.
+
+    :param dirname: string path to directory containing input files
+    :param files: list of string file names in dirname
+    :param payload: integer number of bytes of pixel data in each input file
+    :return: integer header length in bytes, or None to locate pixel data per TIFF file
+    """
+    if files and all(fl.lower().endswith(('.tif', '.tiff')) for fl in files):
+        return None
+    return header_length([os.path.getsize(os.path.join(dirname, fl)) for fl in files], payload)
+
+
+def tiff_pixel_offset(path, payload, black_is_zero=True):
+    """
+    Locate the pixel data of the first page of a TIFF file for copying to a raw .dat file
+    :param path: string path to TIFF file
+    :param payload: integer number of bytes of pixel data expected in the page
+    :param black_is_zero: boolean False to locate stored values of any photometric interpretation
+    :return: integer byte offset of the pixel data, or None if the page must be decoded;
+             see decode_tiff_pixels()
+    """
+    info = parse_tiff(path)[0]
+    offset = tiff_data_offset(info, black_is_zero)
+    if offset is None:
+        return None
+    nbytes = info['width']*info['height']*tiff_dtype(info).itemsize
+    if nbytes != payload:
+        raise ParseError(message="TIFF file {0} holds {1} bytes of pixel data; expected {2}. Check for correct "
+                                 "Image Width, Height and Bit Depth.".format(path, nbytes, payload),
+                         errors={'info': info})
+    return offset
+
+
+def decode_tiff_pixels(path, payload):
+    """
+    Decode the first page of a TIFF file which cannot be copied in place to raw pixel data
+    Compressed, palette, colour and WhiteIsZero pages are decoded with PIL as when
+    loading images, and stored in the byte order of the TIFF file as copied pages are.
+    :param path: string path to TIFF file
+    :param payload: integer number of bytes of pixel data expected in the page
+    :return: bytes of pixel data
+    """
+    bo = parse_tiff(path)[0]['byte_order']
+    img = pil_to_array(Image.open(path))
+    if img.nbytes != payload:
+        raise ParseError(message="TIFF file {0} decodes to {1} bytes of pixel data; expected {2}. Check for correct "
+                                 "Image Width, Height and Bit Depth.".format(path, img.nbytes, payload),
+                         errors={'shape': img.shape, 'dtype': img.dtype.str})
+    return np.ascontiguousarray(img, dtype=img.dtype.newbyteorder(bo)).tobytes()
+
+
+def convert_dat_file(src, dst, header, payload):
+    """
+    Copy the pixel data of one data file to a raw binary file with no header
+    The pixel data is streamed in blocks of COPY_BUFSIZE bytes and written under
+    a temporary name which is only moved into place once complete, so an
+    interrupted conversion never leaves a truncated output file behind.
+
+    :param src: string path to input file
+    :param dst: string path to output .dat file
+    :param header: integer header length in bytes to skip, or None to read the pixel data offset of a TIFF file
+    :param payload: integer number of bytes of pixel data
+    :return: integer number of bytes written; 0 if dst already holds a complete conversion
+    """
+    if os.path.isfile(dst) and os.path.getsize(dst) == payload:
+        return 0  # converted by a previous run
+    tmp = dst + '.part'
+    if header is None:
+        header = tiff_pixel_offset(src, payload)
+    if header is None:
+        try:
+            pixels = decode_tiff_pixels(src, payload)
+        except (IOError, OSError, SyntaxError):
+            # PIL cannot decode some uncompressed pages, e.g. big endian 16 bit
+            # WhiteIsZero; copy their stored values unchanged
+            header = tiff_pixel_offset(src, payload, black_is_zero=False)
+            if header is None:
+                raise
+        else:
+            with open(tmp, 'wb') as o:
+                o.write(pixels)
+            os.replace(tmp, dst)
+            return payload
+    with open(src, 'rb') as f, open(tmp, 'wb') as o:
+        f.seek(header)  # strip header information
+        remaining = payload
+        while remaining:
+            buf = f.read(min(COPY_BUFSIZE, remaining))
+            if not buf:
+                break
+            o.write(buf)
+            remaining -= len(buf)
+    if remaining:
+        os.remove(tmp)
+        raise IOError("File {0} is too short: read {1} of {2} bytes.".format(src, payload - remaining, payload))
+    os.replace(tmp, dst)
+    return payload
+
+
+def convert_to_dat(dirname, outdirname, files, header, payload, workers=None, callback=None):
+    """
+    Convert a batch of data files to raw binary .dat files concurrently
+    Conversion is I/O bound and file reads and writes release the GIL, so a pool
+    of threads keeps several files in flight at once. Outputs which already exist
+    with the expected size are skipped, allowing an interrupted batch to be resumed.
+
+    :param dirname: string path to directory containing input files
+    :param outdirname: string path to directory to output raw .dat files
+    :param files: list of string file names in dirname to convert
+    :param header: integer header length in bytes of each input file, or None for TIFF files; see dat_header()
+    :param payload: integer number of bytes of pixel data in each input file
+    :param workers: integer number of threads; default is the number of CPUs
+    :param callback: optional callable(count, total) called as each file completes
+    :return: list of string names of files which failed to convert
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    print('Converting {0} files using {1} threads ...'.format(len(files), workers))
+    start = time.time()
+    nbytes = 0
+    skipped = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_dat_file,
+                               os.path.join(dirname, fl),
+                               os.path.join(outdirname, fl.split('.')[0]+'.dat'),
+                               header, payload): fl for fl in files}
+        for count, future in enumerate(as_completed(futures), 1):
+            try:
+                written = future.result()
+            except (IOError, OSError) as e:
+                print(e)
+                failed.append(futures[future])
+                written = None
+            except ParseError as e:
+                print(e.message)
+                failed.append(futures[future])
+                written = None
+            if written == 0:
+                skipped += 1
+            elif written:
+                nbytes += written
+            if callback is not None:
+                callback(count, len(files))
+    elapsed = max(time.time() - start, 1e-6)
+    print('Converted {0} files ({1:.1f} MB) in {2:.2f} s: {3:.1f} MB/s'.format(
+        len(files) - skipped - len(failed), nbytes/1024**2, elapsed, nbytes/1024**2/elapsed))
+    if skipped:
+        print('Skipped {} files already converted by a previous run.'.format(skipped))
+    if failed:
+        print('Failed to convert {} files.'.format(len(failed)))
+    return failed
+
+
 def parse_dir(dirname):
     """
     Hack to remove '/path/to/folder/untitled/' error from QTFileDialog where /untitled/ gets appended by default
@@ -0,0 +1,164 @@
+"""
+Chunked, compressed on-disk format for archiving LEEM and LEED data sets.
+
+The 3d data array (row, col, energy) is split into fixed size 3d chunks
+which are compressed individually with zlib from the standard library.
+An index of chunk offsets is stored alongside the energy list and any
+Experiment metadata, so reading one frame or one I(V) curve only needs
+to decompress the chunks which intersect it.
+
+File Layout:
+    8 bytes     magic string b'PLEASEZ1'
+    8 bytes     little endian unsigned integer offset of the JSON trailer
+    chunks      zlib compressed chunks, written one block of energies at a time
+    trailer     utf-8 JSON: shape, dtype, chunk shape, energy list, metadata and
+                the chunk index of (offset, length) in C order over the chunk grid
+"""
+import itertools
+import json
+import struct
+import threading
+import zlib
+import numpy as np
+import LEEMFUNCTIONS as LF
+
+MAGIC = b'PLEASEZ1'
+EXT = '.pchunk'
+DEF_CHUNKS = (64, 64, 16)  # (rows, cols, energies) per chunk
+DEF_LEVEL = 6  # zlib compression level
+DEF_CACHE_BYTES = 64*1024**2  # decompressed chunks kept in memory by ChunkedStack
+
+
+def save_dataset(dataobj, fl, metadata=None, chunks=DEF_CHUNKS, level=DEF_LEVEL):
+    """
+    Write the data set held by a LeemData or LeedData container to a chunked file
+    Data is read one block of energies at a time so lazily loaded data is never fully resident.
+
+    :param dataobj: LeemData or LeedData object holding the data set and energy list
+    :param fl: string path to output file
+    :param metadata: dictionary of JSON serializable information to store with the data
+    :param chunks: tuple of integer chunk dimensions (rows, cols, energies)
+    :param level: integer zlib compression level 0-9
+    :return: None
+    """
+    ht, wd, num = dataobj.shape
+    cr, cc, ce = chunks
+    dtype = np.dtype(dataobj.dtype)
+    index = []
+    with open(fl, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', 0))  # placeholder for trailer offset
+        # data is read one block of energies at a time; the index is
+        # sorted into C order (row chunk, col chunk, energy chunk) afterwards
+        blocks = {}
+        for e0 in range(0, num, ce):
+            block = dataobj.window(0, ht, 0, wd, e0, e0+ce)
+            for r0 in range(0, ht, cr):
+                for c0 in range(0, wd, cc):
+                    payload = zlib.compress(np.ascontiguousarray(block[r0:r0+cr, c0:c0+cc, :]).tobytes(), level)
+                    blocks[(r0 // cr, c0 // cc, e0 // ce)] = (f.tell(), len(payload))
+                    f.write(payload)
+        for key in sorted(blocks):
+            index.append(list(blocks[key]))
+
+        trailer = {'shape': [ht, wd, num],
+                   'dtype': dtype.str,
+                   'chunks': [cr, cc, ce],
+                   'codec': 'zlib',
+                   'index': index,
+                   'elist': list(dataobj.elist) if dataobj.elist is not None else None,
+                   'metadata': metadata}
+        offset = f.tell()
+        f.write(json.dumps(trailer, default=str).encode('utf-8'))
+        f.seek(len(MAGIC))
+        f.write(struct.pack('<Q', offset))
+    print("Wrote chunked data set {}".format(fl))
+
+
+def load_dataset(fl, dataobj=None, cache_bytes=DEF_CACHE_BYTES):
+    """
+    Open a chunked data file for random access
+    :param fl: string path to chunked data file
+    :param dataobj: optional LeemData or LeedData object to fill with the data and energy list
+    :param cache_bytes: integer maximum size in bytes of decompressed chunks kept in memory
+    :return: ChunkedStack
+    """
+    stack = ChunkedStack(fl, cache_bytes=cache_bytes)
+    if dataobj is not None:
+        dataobj.set_data(stack)
+        if stack.elist is not None:
+            dataobj.elist = list(stack.elist)
+    return stack
+
+
+class ChunkedStack(LF.LazyStack):
+    """
+    Read-only array-like view of a chunked data file
+    Indexing decompresses only the chunks intersecting the requested region.
+    Recently used chunks are kept in a bounded LRU cache.
+    """
+
+    def __init__(self, fl, cache_bytes=DEF_CACHE_BYTES):
+        self.fl = fl
+        self._file = open(fl, 'rb')
+        self._lock = threading.Lock()  # one seek and read of the file at a time
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise LF.ParseError(message="File {} is not a chunked data set.".format(fl), errors=None)
+        offset = struct.unpack('<Q', self._file.read(8))[0]
+        self._file.seek(offset)
+        trailer = json.loads(self._file.read().decode('utf-8'))
+        super(ChunkedStack, self).__init__(trailer['shape'], trailer['dtype'])
+        self.chunks = tuple(trailer['chunks'])
+        self.elist = trailer['elist']
+        self.metadata = trailer['metadata']
+        self.grid = tuple(-(-dim // chunk) for dim, chunk in zip(self.shape, self.chunks))
+        self._index = trailer['index']
+        self._cache = LF.LRUCache(cache_bytes)
+
+    def close(self):
+        self._file.close()
+
+    def chunk(self, key):
+        """
+        :param key: tuple (row chunk, col chunk, energy chunk) indices into the chunk grid
+        :return: decompressed 3d chunk
+        """
+        arr = self._cache.get(key)
+        if arr is not None:
+            return arr
+        with self._lock:
+            offset, length = self._index[(key[0]*self.grid[1] + key[1])*self.grid[2] + key[2]]
+            self._file.seek(offset)
+            payload = self._file.read(length)
+        shape = tuple(min(chunk, dim - k*chunk) for k, chunk, dim in zip(key, self.chunks, self.shape))
+        arr = np.frombuffer(zlib.decompress(payload), dtype=self.dtype).reshape(shape)
+        return self._cache.put(key, arr)
+
+    def get_frame(self, idx):
+        return self[:, :, idx]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError("Too many indices for 3d data stack")
+        key = key + (slice(None),) * (3 - len(key))
+        # convert each index to an array of positions; integers drop their axis
+        indices = [np.arange(dim)[k] for dim, k in zip(self.shape, key)]
+        keep = [idx.ndim > 0 for idx in indices]
+        indices = [np.atleast_1d(idx) for idx in indices]
+
+        out = np.empty(tuple(len(idx) for idx in indices), dtype=self.dtype)
+        # group the requested positions along each axis by the chunk containing them
+        groups = []
+        for idx, chunk in zip(indices, self.chunks):
+            cid = idx // chunk
+            groups.append([(c, np.nonzero(cid == c)[0]) for c in np.unique(cid)])
+        for (rc, rpos), (cc, cpos), (ec, epos) in itertools.product(*groups):
+            arr = self.chunk((int(rc), int(cc), int(ec)))
+            local = np.ix_(indices[0][rpos] - rc*self.chunks[0],
+                           indices[1][cpos] - cc*self.chunks[1],
+                           indices[2][epos] - ec*self.chunks[2])
+            out[np.ix_(rpos, cpos, epos)] = arr[local]
+        return out.reshape(tuple(len(idx) for idx, k in zip(indices, keep) if k))
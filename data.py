@@ -12,9 +12,91 @@ third axis of the numpy array.
 import os
 import numpy as np
 import LEEMFUNCTIONS as LF
+import datasource
 
 
-class LeedData(object):
+class DataContainer(object):
+    """
+    Access to the main 3d data set (row, col, energy) of a LEEM or LEED container
+    The data is held by a datasource.DataSource so that data loaded into memory,
+    memory mapped, chunked on disk or decoded on demand can be used interchangeably.
+    All access to the data should go through frame(), curve(), window() and integrate().
+    """
+    source = None
+
+    def set_data(self, data, layout='frame'):
+        """
+        Store the main 3d data set (row, col, energy)
+        :param data: 3d numpy array, array-like LF.LazyStack or datasource.DataSource
+        :param layout: string 'frame' to store data as loaded or 'dual' to store both memory layouts
+        """
+        if self.source is not None and self.source.data is not data:
+            self.source.close()  # release files held by a replaced data set
+        self.source = datasource.open_source(data, layout=layout)
+        self.nloaded = self.source.shape[2]
+
+    @property
+    def dat3d(self):
+        """The underlying 3d data as returned by the loader."""
+        if self.source is None:
+            return None
+        return self.source.data
+
+    @dat3d.setter
+    def dat3d(self, data):
+        self.set_data(data)
+
+    def clear(self):
+        """Release the main data set, e.g. after loading it failed part way."""
+        if self.source is not None:
+            self.source.close()
+        self.source = None
+        self.nloaded = 0
+
+    @property
+    def shape(self):
+        """tuple (height, width, number of energies) of the data set"""
+        return self.source.shape
+
+    @property
+    def dtype(self):
+        return self.source.dtype
+
+    @property
+    def lazy(self):
+        """True if frames are read from disk or decoded when requested"""
+        return self.source.lazy
+
+    def frame(self, idx):
+        """
+        :param idx: integer index along the energy axis
+        :return: 2d image (row, col) at energy index idx
+        """
+        return self.source.frame(idx)
+
+    def curve(self, r, c):
+        """
+        :param r: integer row (y) coordinate
+        :param c: integer column (x) coordinate
+        :return: 1d array of intensity vs energy at pixel (r, c)
+        """
+        return self.source.curve(r, c)
+
+    def window(self, r0, r1, c0, c1, e0=0, e1=None):
+        """
+        :return: 3d numpy array of the region [r0:r1, c0:c1, e0:e1], see datasource.DataSource.window()
+        """
+        return self.source.window(r0, r1, c0, c1, e0, e1)
+
+    def integrate(self, windows):
+        """
+        :param windows: list of tuples (r0, r1, c0, c1) of window bounds; r1 and c1 are exclusive
+        :return: list of 1d numpy arrays of intensity summed over each window at each energy
+        """
+        return self.source.integrate(windows)
+
+
+class LeedData(DataContainer):
     """
     Generic object to hold LEED Data and relevant variables
     Data loading methods
@@ -30,9 +112,10 @@ class LeedData(object):
         self.wd = 0  # Width of image used in loading Raw data
         self.box_rad = br  # default value is 20 yielding a 40x40 rectangular integration window
         self.average_ilist = None
+        self.nloaded = 0
 
 
-class LeemData(object):
+class LeemData(DataContainer):
     """
     Generic object to hold LEEM data and relevant variables
     LEEM loading functions are already contained in LEEMFUNCTIONs.py
@@ -55,3 +138,4 @@ class LeemData(object):
         # Coordinates for I(V) data
         self.curX = 0
         self.curY = 0
+        self.nloaded = 0  # number of frames available; less than shape[2] while loading
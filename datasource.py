@@ -0,0 +1,257 @@
+"""
+Data sources providing uniform access to a 3d LEEM or LEED data set.
+
+The viewer only ever asks a data set for an image at one energy, an I(V)
+curve at one pixel, or a rectangular window across energies. Each storage
+backend answers these requests in the way that suits it best:
+
+    ArraySource             data fully loaded in memory, optionally stored twice
+                            so both images and curves are contiguous
+    MappedSource            raw .dat files, uncompressed TIFFs or a consolidated
+                            cache file memory mapped in place
+    ChunkedSource           chunked, compressed data file from chunkstore
+    ImageDirectorySource    directory of image files decoded on demand
+
+open_source() picks the appropriate source for the data returned by a loader.
+FramePrefetcher reads frames of a lazy source ahead of the one being displayed.
+"""
+import threading
+import numpy as np
+import chunkstore
+import LEEMFUNCTIONS as LF
+
+LAYOUTS = ['frame', 'dual']  # memory layouts of in memory data, see ArraySource
+
+
+class DataSource(object):
+    """
+    Base data source wrapping a 3d numpy array or array-like (row, col, energy)
+    """
+    block = 64  # number of energies read at once when integrating windows
+    lazy = False  # True if frames are read from disk or decoded when requested
+
+    def __init__(self, data):
+        """
+        :param data: 3d numpy array or array-like LF.LazyStack (row, col, energy)
+        """
+        self.data = data
+
+    @property
+    def shape(self):
+        return tuple(self.data.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.data.dtype)
+
+    def frame(self, idx):
+        """
+        :param idx: integer index along the energy axis
+        :return: 2d image (row, col) at energy index idx
+        """
+        return self.data[:, :, idx]
+
+    def curve(self, r, c):
+        """
+        :param r: integer row (y) coordinate
+        :param c: integer column (x) coordinate
+        :return: 1d array of intensity vs energy at pixel (r, c)
+        """
+        return self.data[r, c, :]
+
+    def window(self, r0, r1, c0, c1, e0=0, e1=None):
+        """
+        Read a rectangular region across a range of energies
+        Bounds extending past the edge of the image are clipped to the image.
+        :param r0: integer first row
+        :param r1: integer row past the end of the window
+        :param c0: integer first column
+        :param c1: integer column past the end of the window
+        :param e0: integer first energy index
+        :param e1: integer energy index past the end of the window, default None for all remaining energies
+        :return: 3d numpy array (row, col, energy)
+        """
+        ht, wd, num = self.shape
+        return np.asarray(self.data[max(r0, 0):min(r1, ht), max(c0, 0):min(c1, wd), e0:e1])
+
+    def integrate(self, windows):
+        """
+        :param windows: list of tuples (r0, r1, c0, c1) of window bounds; r1 and c1 are exclusive
+        :return: list of 1d numpy arrays of intensity summed over each window at each energy
+        """
+        return LF.integrate_windows(self.data, windows, block=self.block)
+
+    def close(self):
+        """Release any files or processes held by the source."""
+        close = getattr(self.data, 'close', None)
+        if close is not None:
+            close()
+
+
+class ArraySource(DataSource):
+    """
+    Data set held in memory as a numpy array
+    Displaying images reads whole frames at a single energy while
+    extracting I(V) reads a single pixel across all energies. No single
+    memory layout makes both of these contiguous, so the 'dual' layout
+    keeps one copy ordered for each type of access at the cost of twice the memory.
+    """
+
+    def __init__(self, data, layout='frame'):
+        """
+        :param data: 3d numpy array (row, col, energy)
+        :param layout: string 'frame' to store data as loaded or 'dual' to store both layouts
+        """
+        if layout not in LAYOUTS:
+            raise ValueError("Invalid memory layout {}; use 'frame' or 'dual'.".format(layout))
+        self.frames = None  # energy-major (energy, row, col): contiguous images
+        if layout == 'dual':
+            # loaders return energy-major data so this is usually a view, not a copy
+            self.frames = np.ascontiguousarray(np.moveaxis(data, 2, 0))
+            # pixel-major (row, col, energy): contiguous I(V) curves
+            data = np.ascontiguousarray(data)
+        super(ArraySource, self).__init__(data)
+
+    def frame(self, idx):
+        if self.frames is not None:
+            return self.frames[idx]
+        return self.data[:, :, idx]
+
+
+class MappedSource(DataSource):
+    """
+    Data set memory mapped from disk: an LF.MappedStack of raw files, an
+    LF.TiffStack or a numpy memmap of a consolidated cache file
+    Pages are read by the operating system only when touched.
+    """
+    lazy = True
+
+
+class ChunkedSource(DataSource):
+    """
+    Data set stored in a chunked, compressed file
+    Windows are integrated one energy chunk at a time so each chunk is
+    decompressed once per window.
+    """
+    lazy = True
+
+    @property
+    def block(self):
+        return self.data.chunks[2]
+
+
+class ImageDirectorySource(DataSource):
+    """
+    Data set of image files decoded on demand by an LF.ImageStack
+    Windows are integrated over many energies at once so that images can be
+    decoded in parallel.
+    """
+    lazy = True
+
+    @property
+    def block(self):
+        return max(DataSource.block, 4*(self.data.workers or 1))
+
+
+def open_source(data, layout='frame'):
+    """
+    Wrap data returned by a loader in the matching data source
+    :param data: 3d numpy array, numpy memmap or LF.LazyStack (row, col, energy)
+    :param layout: string memory layout for in memory data, 'frame' or 'dual'
+    :return: DataSource
+    """
+    if layout not in LAYOUTS:
+        raise ValueError("Invalid memory layout {}; use 'frame' or 'dual'.".format(layout))
+    if isinstance(data, DataSource):
+        return data
+    if isinstance(data, chunkstore.ChunkedStack):
+        return ChunkedSource(data)
+    if isinstance(data, LF.ImageStack):
+        return ImageDirectorySource(data)
+    if isinstance(data, (np.memmap, LF.LazyStack)):
+        if layout == 'dual':
+            print("Dual layout requires data loaded into memory; using data as loaded.")
+        return MappedSource(data)
+    return ArraySource(data, layout=layout)
+
+
+class FramePrefetcher(object):
+    """
+    Read frames of a lazy data source ahead of the one being displayed
+    While the user steps through energies a background thread reads the next
+    frames in the direction of travel into an LRU cache bounded by a memory
+    budget, so displaying them does not wait on disk reads or decoding.
+    Sources held in memory are passed through without a background thread.
+    """
+
+    def __init__(self, source, ahead=8, cache_bytes=256*1024**2):
+        """
+        :param source: DataSource, or LeemData/LeedData container, to read frames from
+        :param ahead: integer number of frames to read ahead of the current frame
+        :param cache_bytes: integer maximum size in bytes of frames kept in memory
+        """
+        self.source = source
+        frame_bytes = max(1, source.shape[0]*source.shape[1]*source.dtype.itemsize)
+        # leave room for frames behind the current one when changing direction
+        self.ahead = max(1, min(ahead, cache_bytes // (2*frame_bytes)))
+        self._cache = LF.LRUCache(cache_bytes)
+        self._wanted = []  # frames to read, nearest first
+        self._lock = threading.Lock()  # protects the list of wanted frames
+        self._wake = threading.Condition(self._lock)
+        self._stopped = False
+        self._thread = None
+        if source.lazy:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def get(self, idx):
+        """
+        :param idx: integer index along the energy axis
+        :return: 2d image (row, col) at energy index idx
+        """
+        if self._thread is None:
+            return self.source.frame(idx)
+        frame = self._cache.get(idx)
+        if frame is None:
+            frame = self._cache.put(idx, self._read(idx))
+        return frame
+
+    def update(self, idx, direction=1):
+        """
+        Start reading the frames following idx in the direction of travel
+        :param idx: integer index of the frame being displayed
+        :param direction: integer +1 when stepping to higher energies, -1 for lower energies
+        """
+        if self._thread is None:
+            return
+        num = self.source.shape[2]
+        wanted = [idx + direction*k for k in range(1, self.ahead + 1)]
+        with self._lock:
+            self._wanted = [fnum for fnum in wanted if 0 <= fnum < num and fnum not in self._cache]
+            self._wake.notify()
+
+    def stop(self):
+        """Stop the background thread; frames are then read on request only."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopped = True
+            self._wake.notify()
+        self._thread = None
+
+    def _read(self, idx):
+        # sources are safe to read from several threads at once; copy so
+        # that memory mapped frames are actually read from disk here
+        return np.array(self.source.frame(idx))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._wanted and not self._stopped:
+                    self._wake.wait()
+                if self._stopped:
+                    return
+                idx = self._wanted.pop(0)
+            if idx not in self._cache:
+                self._cache.put(idx, self._read(idx))
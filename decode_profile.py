@@ -0,0 +1,59 @@
+"""
+Compare the time taken to decode a stack of 16 bit TIFF images
+using the legacy LF.read_img() and the vectorized LF.decode_img().
+
+Usage:
+    python decode_profile.py [path/to/tiff/directory]
+    If no directory is given a temporary stack of random 16 bit images is generated.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+import LEEMFUNCTIONS as LF
+
+
+def make_test_stack(path, n=50, shape=(600, 592)):
+    """Write n random 16 bit greyscale TIFF files to path."""
+    for idx in range(n):
+        img = np.random.randint(0, 65535, size=shape, dtype=np.uint16)
+        Image.fromarray(img).save(os.path.join(path, 'img{:04d}.tif'.format(idx)))
+
+
+def time_decoder(decoder, files):
+    ts = time.time()
+    frames = [decoder(fl) for fl in files]
+    return time.time() - ts, frames
+
+
+def main():
+    tmpdir = None
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        tmpdir = tempfile.mkdtemp()
+        path = tmpdir
+        print("Generating test images in {} ...".format(path))
+        make_test_stack(path)
+    files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                   if name.endswith('.tif') or name.endswith('.tiff'))
+    try:
+        told, legacy = time_decoder(LF.read_img, files)
+        print('Time to decode {0} images using read_img: {1:.3f} seconds'.format(len(files), told))
+
+        tnew, native = time_decoder(LF.decode_img, files)
+        print('Time to decode {0} images using decode_img: {1:.3f} seconds'.format(len(files), tnew))
+        print('Speedup: {:.1f}x'.format(told / tnew))
+
+        print('read_img: dtype={0}, max value={1}'.format(legacy[0].dtype, max(fr.max() for fr in legacy)))
+        print('decode_img: dtype={0}, max value={1}'.format(native[0].dtype, max(fr.max() for fr in native)))
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
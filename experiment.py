@@ -33,6 +33,13 @@ class Experiment(object):
         self.num_files = ''
         self.imw = ''
         self.imh = ''
+        self.mmap = False  # optional: memory map raw and TIFF data or decode images on demand instead of reading into RAM
+        self.workers = None  # optional: number of concurrent file readers
+        self.cache = False  # optional: keep a consolidated binary cache of loaded data
+        self.layout = 'frame'  # optional: 'frame' or 'dual' memory layout for LEEM data
+        self.progressive = False  # optional: display LEEM frames while loading
+        self.prefetch = 8  # optional: number of frames read ahead when stepping through lazily loaded data
+        self.smooth_dtype = 'float32'  # optional: 'float32' or 'float64' precision of smoothed I(V) curves
 
         self.loaded_settings = None
 
@@ -72,6 +79,27 @@ class Experiment(object):
             self.imw = img_settings['Width']
             self.imh = img_settings['Height']
 
+            # Optional settings
+            self.mmap = bool(exp_settings.get('Memory Map', False))
+            self.workers = exp_settings.get('Workers', None)
+            self.cache = bool(exp_settings.get('Cache', False))
+            self.layout = str(exp_settings.get('Layout', 'frame')).lower()
+            if self.layout not in ['frame', 'dual']:
+                print("Layout must be frame or dual; using frame.")
+                self.layout = 'frame'
+            self.progressive = bool(exp_settings.get('Progressive', False))
+            try:
+                self.prefetch = int(exp_settings.get('Prefetch', 8))
+            except (TypeError, ValueError):
+                self.prefetch = -1
+            if self.prefetch < 0:
+                print("Prefetch must be a non-negative integer; using 8.")
+                self.prefetch = 8
+            self.smooth_dtype = str(exp_settings.get('Smoothing Precision', 'float32')).lower()
+            if self.smooth_dtype not in ['float32', 'float64']:
+                print("Smoothing Precision must be float32 or float64; using float32.")
+                self.smooth_dtype = 'float32'
+
             # self.loaded_settings = None
             # pp.pprint(vars(self))
 
@@ -29,7 +29,10 @@ import pyqtgraph as pg
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 # local project imports
+import chunkstore
 import LEEMFUNCTIONS as LF
+from datasource import FramePrefetcher
+from smoothcache import SmoothCacheLRU
 from configinfo import output_environment_config
 from colors import Palette
 from data import LeedData, LeemData
@@ -39,6 +42,7 @@ from terminal import MessageConsole
 
 __Version = '1.0.0'
 __imgorder = 'row-major'  # pyqtgraph global setting
+WATCH_INTERVAL = 1000  # milliseconds between checks for new files when watching a data directory
 
 
 class ExtendedCrossHair(QtCore.QObject):
@@ -111,6 +115,14 @@ class MainWindow(QtWidgets.QMainWindow):
         helpMenu = self.menubar.addMenu("Help")
 
         # File menu
+        exportLEEMAction = QtWidgets.QAction("Export LEEM Data Set...", self)
+        exportLEEMAction.triggered.connect(lambda: self.viewer.exportDataSet(datatype='LEEM'))
+        fileMenu.addAction(exportLEEMAction)
+
+        exportLEEDAction = QtWidgets.QAction("Export LEED Data Set...", self)
+        exportLEEDAction.triggered.connect(lambda: self.viewer.exportDataSet(datatype='LEED'))
+        fileMenu.addAction(exportLEEDAction)
+
         exitAction = QtWidgets.QAction("Exit", self)
         exitAction.setShortcut('Ctrl+Q')
         exitAction.triggered.connect(self.quit)
@@ -125,6 +137,21 @@ class MainWindow(QtWidgets.QMainWindow):
         clearLEEMAction.triggered.connect(self.viewer.clearLEEMIV)
         LEEMMenu.addAction(clearLEEMAction)
 
+        watchLEEMAction = QtWidgets.QAction("Watch Data Directory", self)
+        watchLEEMAction.setCheckable(True)
+        watchLEEMAction.triggered.connect(
+            lambda checked: watchLEEMAction.setChecked(self.viewer.toggleLEEMWatch(checked)))
+        LEEMMenu.addAction(watchLEEMAction)
+        self.viewer.watchLEEMAction = watchLEEMAction  # unchecked when a new data set is loaded
+
+        smoothLEEMAction = QtWidgets.QAction("Smooth Data Set", self)
+        smoothLEEMAction.triggered.connect(self.viewer.smoothLEEMDataSet)
+        LEEMMenu.addAction(smoothLEEMAction)
+
+        cancelSmoothLEEMAction = QtWidgets.QAction("Cancel Smoothing", self)
+        cancelSmoothLEEMAction.triggered.connect(self.viewer.cancelLEEMSmoothing)
+        LEEMMenu.addAction(cancelSmoothLEEMAction)
+
         # LEED menu
         extractAction = QtWidgets.QAction("Extract I(V)", self)
         # extractAction.setShortcut("Ctrl-E")
@@ -210,12 +237,32 @@ class Viewer(QtWidgets.QWidget):
         self.LEEMWindowType = 'flat'
         self.LEEDWindowLen = 4
         self.LEEMWindowLen = 4
+        # smoothers reuse their window and padding buffers between curves
+        self.LEEDsmoother = LF.Smoother(self.LEEDWindowLen, self.LEEDWindowType)
+        self.LEEMsmoother = LF.Smoother(self.LEEMWindowLen, self.LEEMWindowType)
 
         self.exp = None  # overwritten on load with Experiment object
         self.hasdisplayedLEEMdata = False
         self.hasdisplayedLEEDdata = False
         self.curLEEMIndex = 0
         self.curLEEDIndex = 0
+        self.currentLEEMPos = None  # (x, y) of the mouse in LEEM data coordinates
+        self.LEEMloading = False  # True while a progressive load is filling self.leemdat
+        self.LEEMloadfailed = False  # True if the last LEEM load raised an error
+        self.LEEMwatching = False  # True while new files in the data directory are appended
+        self.LEEMwatchtimer = QtCore.QTimer()
+        self.LEEMwatchtimer.timeout.connect(self.checkLEEMDirectory)
+        self.LEEMscanthread = None  # WorkerThread reading new files in the watched directory
+        self.watchLEEMAction = None  # checkable menu action set by MainWindow.setupMenu()
+        self.LEEMpyramid = None  # LF.ImagePyramid of downsampled LEEM frames for display
+        self.LEEMprefetch = None  # FramePrefetcher reading LEEM frames ahead of the displayed one
+        self.LEEDprefetch = None  # FramePrefetcher reading LEED frames ahead of the displayed one
+        self.prefetchBytes = 256*1024**2  # memory budget for each prefetcher
+        self.LEEMlevel = 0  # pyramid level currently displayed, 0 is full resolution
+        self.LEEMsmooththread = None  # WorkerThread smoothing the full LEEM data set
+        # smoothed LEEM curves for recently used smoothing settings; replaced on each load
+        self.smoothCacheBytes = 1024**3  # memory budget for smoothed LEEM curves
+        self.LEEMsmoothcaches = SmoothCacheLRU(cache_bytes=self.smoothCacheBytes)
         dummydata = np.zeros((10, 10))
         self.LEEMimage = pg.ImageItem(dummydata)  # required for signal hook
         self.LEEDimage = pg.ImageItem(dummydata)
@@ -260,6 +307,8 @@ class Viewer(QtWidgets.QWidget):
                                        **self.labelStyle)
 
         self.LEEMimageplotwidget.addItem(self.LEEMimage)
+        # display a lower resolution image when zoomed out on large frames
+        self.LEEMimageplotwidget.getPlotItem().getViewBox().sigRangeChanged.connect(self.updateLEEMImageLevel)
         ivvbox.addWidget(self.LEEMivplotwidget)
         self.LEEMTabLayout.addLayout(ivvbox)
         self.LEEMTab.setLayout(self.LEEMTabLayout)
@@ -532,6 +581,12 @@ class Viewer(QtWidgets.QWidget):
         if self.exp is None:
             return
         self.tabs.setCurrentIndex(0)
+        # stop appending files from a previously watched directory
+        self.LEEMwatchtimer.stop()
+        self.LEEMwatching = False
+        if self.watchLEEMAction is not None:
+            self.watchLEEMAction.setChecked(False)
+        self.LEEMloadfailed = False
         if self.exp.data_type.lower() == 'raw':
             try:
                 # use settings from self.sexp
@@ -540,12 +595,20 @@ class Viewer(QtWidgets.QWidget):
                                            imht=self.exp.imh,
                                            imwd=self.exp.imw,
                                            bits=self.exp.bit,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           mmap=self.exp.mmap,
+                                           workers=self.exp.workers,
+                                           cache=self.exp.cache,
+                                           energy=(self.exp.mine, self.exp.stepe),
+                                           progressive=self.exp.progressive,
+                                           layout=self.exp.layout)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     pass  # no signals connected, that's OK, continue as needed
                 self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+                self.thread.connectProgressSignal(self.retrieve_LEEM_partial)
+                self.thread.connectErrorSignal(self.LEEM_load_failed)
                 self.thread.finished.connect(self.update_LEEM_img_after_load)
                 self.thread.start()
             except ValueError:
@@ -557,12 +620,20 @@ class Viewer(QtWidgets.QWidget):
             try:
                 self.thread = WorkerThread(task='LOAD_LEEM_IMAGES',
                                            path=self.exp.path,
-                                           ext=self.exp.ext)
+                                           ext=self.exp.ext,
+                                           mmap=self.exp.mmap,
+                                           workers=self.exp.workers,
+                                           cache=self.exp.cache,
+                                           energy=(self.exp.mine, self.exp.stepe),
+                                           progressive=self.exp.progressive,
+                                           layout=self.exp.layout)
                 try:
                     self.thread.disconnect()
                 except TypeError:
                     pass  # no signals connected, that's OK, continue as needed
                 self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+                self.thread.connectProgressSignal(self.retrieve_LEEM_partial)
+                self.thread.connectErrorSignal(self.LEEM_load_failed)
                 self.thread.finished.connect(self.update_LEEM_img_after_load)
                 self.thread.start()
             except ValueError:
@@ -573,6 +644,19 @@ class Viewer(QtWidgets.QWidget):
                 print('Check file extensions: \'.tif\' and \'.png\'.')
                 return
 
+        elif self.exp.data_type.lower() == 'chunked':
+            # Data Path points to a file written by File > Export LEEM Data Set
+            self.thread = WorkerThread(task='LOAD_CHUNKED',
+                                       path=self.exp.path)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                pass  # no signals connected, that's OK, continue as needed
+            self.thread.connectOutputSignal(self.retrieve_LEEM_data)
+            self.thread.connectErrorSignal(self.LEEM_load_failed)
+            self.thread.finished.connect(self.update_LEEM_img_after_load)
+            self.thread.start()
+
     def load_LEED_experiment(self):
         """Load LEED data from settings described by YAML config file."""
         if self.exp is None:
@@ -590,7 +674,11 @@ class Viewer(QtWidgets.QWidget):
                                            imht=self.exp.imh,
                                            imwd=self.exp.imw,
                                            bits=self.exp.bit,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           mmap=self.exp.mmap,
+                                           workers=self.exp.workers,
+                                           cache=self.exp.cache,
+                                           energy=(self.exp.mine, self.exp.stepe))
                 try:
                     self.thread.disconnect()
                 except TypeError:
@@ -608,7 +696,11 @@ class Viewer(QtWidgets.QWidget):
                 self.thread = WorkerThread(task='LOAD_LEED_IMAGES',
                                            ext=self.exp.ext,
                                            path=self.exp.path,
-                                           byte=self.exp.byte_order)
+                                           byte=self.exp.byte_order,
+                                           mmap=self.exp.mmap,
+                                           workers=self.exp.workers,
+                                           cache=self.exp.cache,
+                                           energy=(self.exp.mine, self.exp.stepe))
                 try:
                     self.thread.disconnect()
                 except TypeError:
@@ -624,6 +716,56 @@ class Viewer(QtWidgets.QWidget):
                 print('Valid data extenstions: \'.tif\', \'.png\', \'.jpg\'')
                 return
 
+        elif self.exp.data_type.lower() == 'chunked':
+            # Data Path points to a file written by File > Export LEED Data Set
+            self.thread = WorkerThread(task='LOAD_CHUNKED',
+                                       path=self.exp.path)
+            try:
+                self.thread.disconnect()
+            except TypeError:
+                # no signals connected - this is OK
+                pass
+            self.thread.connectOutputSignal(self.retrieve_LEED_data)
+            self.thread.finished.connect(self.update_LEED_img_after_load)
+            self.thread.start()
+
+    def exportDataSet(self, datatype=None):
+        """Export the loaded data set to a chunked, compressed data file.
+
+        The file can be reloaded by setting 'Data Type' to 'Chunked' and
+        'Data Path' to the exported file in an Experiment config file.
+        :param: datatype- String desginating either 'LEEM' or 'LEED' data to export
+        """
+        if datatype == 'LEEM' and (self.LEEMloading or self.LEEMwatching):
+            # frames are still being added to the data set
+            print("Error: Wait for LEEM data to finish loading before exporting it.")
+            return
+        if datatype == 'LEEM' and self.hasdisplayedLEEMdata:
+            dataobj = self.leemdat
+        elif datatype == 'LEED' and self.hasdisplayedLEEDdata:
+            dataobj = self.leeddat
+        else:
+            print("Error: No {} data has been loaded to export.".format(datatype))
+            return
+
+        msg = "Enter name for exported data set."
+        outname = QtWidgets.QFileDialog.getSaveFileName(self, msg, filter="*" + chunkstore.EXT)
+        outname = str(outname[0])
+        if not outname:
+            return
+        if not outname.endswith(chunkstore.EXT):
+            outname += chunkstore.EXT
+
+        metadata = None
+        if self.exp is not None:
+            metadata = self.exp.loaded_settings
+        thread = WorkerThread(task='EXPORT_CHUNKED',
+                              dataobj=dataobj,
+                              name=outname,
+                              metadata=metadata)
+        self.threads.append(thread)  # keep a reference until the file is written
+        thread.start()
+
     def outputIV(self, datatype=None):
         """Output current I(V) plots as tab delimited text files.
 
@@ -631,6 +773,10 @@ class Viewer(QtWidgets.QWidget):
         """
         if datatype is None:
             return
+        elif datatype == 'LEEM' and self.LEEMloading:
+            # frames which have not been loaded yet hold uninitialized memory
+            print("Error: Wait for LEEM data to finish loading before outputting I(V) curves.")
+            return
         elif datatype == 'LEEM' and self.hasdisplayedLEEMdata and self.LEEMselections:
             outdir = QtWidgets.QFileDialog.getExistingDirectory(self, "Select Output Directory",
                                                                 options=QtWidgets.QFileDialog.ShowDirsOnly)
@@ -664,7 +810,7 @@ class Viewer(QtWidgets.QWidget):
                 outfile = os.path.join(outdir, outname+str(idx)+'.txt')
                 x = tup[1]
                 y = tup[0]
-                ilist = self.leemdat.dat3d[y, x, :]
+                ilist = self.leemdat.curve(y, x)
                 if self.smoothLEEMoutput:
                     ilist = LF.smooth(ilist,
                                       window_len=self.LEEMWindowLen,
@@ -712,9 +858,8 @@ class Viewer(QtWidgets.QWidget):
                 outfile = os.path.join(outdir, outname+str(idx)+'.txt')
                 x = int(tup[1])
                 y = int(tup[0])
-                int_window = self.leeddat.dat3d[y - self.boxrad:y + self.boxrad + 1,
-                                                x - self.boxrad:x + self.boxrad + 1, :]
-                ilist = [img.sum() for img in np.rollaxis(int_window, 2)]
+                ilist = self.leeddat.integrate([(y - self.boxrad, y + self.boxrad + 1,
+                                                 x - self.boxrad, x + self.boxrad + 1)])[0]
                 if self.smoothLEEDoutput:
                     ilist = LF.smooth(ilist,
                                       window_len=self.LEEDWindowLen,
@@ -752,21 +897,19 @@ class Viewer(QtWidgets.QWidget):
         elif window_len % 2 != 0:
             print("Error: Window Length was odd. Using closest even integer")
             window_len += 1
-        if window_type.lower() not in ['flat', 'hanning',
-                                       'hamming', 'bartlett',
-                                       'blackman']:
+        if window_type.lower() not in LF.WINDOW_TYPES:
             print("Error: Invalid Window Type for data smoothing.")
             return
         if but == "LEED":
             self.LEEDWindowType = window_type.lower()
             self.LEEDWindowLen = window_len
+            self.LEEDsmoother = LF.Smoother(window_len, self.LEEDWindowType)
         else:
             self.LEEMWindowType = window_type.lower()
             self.LEEMWindowLen = window_len
-            # Changing the LEEM smoothing settings means we need to
-            # reset our position mask array which declared if we had
-            # previously calculated the smoothed data for a given point (x, y)
-            self.leemdat.posMask.fill(0)
+            self.LEEMsmoother = LF.Smoother(window_len, self.LEEMWindowType)
+            # curves smoothed with the previous settings stay cached in
+            # self.LEEMsmoothcaches in case those settings are used again
         return
 
     @QtCore.pyqtSlot()
@@ -797,37 +940,103 @@ class Viewer(QtWidgets.QWidget):
         """Recieved a finished() SIGNAL from a QThread object."""
         print('File output successfully')
 
-    @QtCore.pyqtSlot(np.ndarray)
+    @QtCore.pyqtSlot(object)
     def retrieve_LEEM_data(self, data):
-        """Grab the 3d numpy array emitted from the data loading I/O thread."""
-        self.leemdat.dat3d = data
-        self.leemdat.dat3ds = data.copy()
-        self.leemdat.posMask = np.zeros((self.leemdat.dat3d.shape[0],
-                                         self.leemdat.dat3d.shape[1]))
+        """Grab the 3d numpy array emitted from the data loading I/O thread.
+
+        data may also be a memory mapped LF.LazyStack which reads frames on demand.
+        """
+        # the 'dual' layout is built by the loading thread; see WorkerThread.arrange_layout()
+        self.leemdat.set_data(data)
+        # smoothed curves of the previous data set can no longer be requested;
+        # tiles of the new data set are only smoothed once smoothing is enabled
+        self.LEEMsmoothcaches = SmoothCacheLRU(cache_bytes=self.smoothCacheBytes,
+                                               dtype=self.exp.smooth_dtype)
         # print("LEEM data recieved from QThread.")
         return
 
-    @QtCore.pyqtSlot(np.ndarray)
+    @QtCore.pyqtSlot(object, int, int)
+    def retrieve_LEEM_partial(self, data, count, total):
+        """Display the frames of a partially loaded data set while loading proceeds.
+
+        Only the first count frames of data have been filled by the loading thread.
+        """
+        first = not self.LEEMloading
+        self.LEEMloading = True
+        self.leemdat.set_data(data)
+        self.leemdat.nloaded = count
+        if first:
+            self.initLEEMImage(0)
+            self.leemdat.elist = LF.gen_energy_list(self.exp.mine, self.exp.stepe, total)
+            self.hasdisplayedLEEMdata = True
+        self.LEEMimtitle.setText("Loading LEEM Data: {0} of {1} frames".format(count, total))
+        if self.currentLEEMPos is not None:
+            self.plotLEEMIV(*self.currentLEEMPos)
+
+    @QtCore.pyqtSlot(str)
+    def LEEM_load_failed(self, message):
+        """Discard a partially loaded data set after the loading thread raised an error.
+
+        Data from before the load is kept if no frames of the new data set were displayed.
+        """
+        self.LEEMloadfailed = True
+        if self.LEEMloading:
+            self.LEEMloading = False
+            if self.LEEMprefetch is not None:
+                self.LEEMprefetch.stop()
+                self.LEEMprefetch = None
+            self.LEEMimageplotwidget.getPlotItem().clear()
+            self.LEEMivplotwidget.getPlotItem().clear()
+            self.leemdat.clear()
+            self.hasdisplayedLEEMdata = False
+            self.currentLEEMPos = None
+        self.LEEMimtitle.setText("Error Loading LEEM Data: {}".format(message))
+        print("Error loading LEEM Experiment:")
+        print("Please Verify Experiment Config Settings.")
+
+    @QtCore.pyqtSlot(object)
     def retrieve_LEED_data(self, data):
         """Grab the numpy array emitted from the data loading I/O thread."""
         # data = [np.fliplr(np.rot90(np.rot90(img))) for img in np.rollaxis(data, 2)]
         # data = np.dstack(data)
-        self.leeddat.dat3d = data
-        self.leeddat.dat3ds = data.copy()
-        self.leeddat.posMask = np.zeros((self.leeddat.dat3d.shape[0],
-                                         self.leeddat.dat3d.shape[1]))
+        self.leeddat.set_data(data)
 
     @QtCore.pyqtSlot()
     def update_LEEM_img_after_load(self):
         """Called upon data loading I/O thread emitting finished signal."""
         # print("QThread has finished execution ...")
+        if self.LEEMloadfailed:
+            return
+        self.LEEMloading = False
+        self.initLEEMImage(self.leemdat.shape[2]//2)
+
+        self.leemdat.elist = getattr(self.leemdat.dat3d, 'elist', None) or \
+            LF.gen_energy_list(self.exp.mine, self.exp.stepe, self.leemdat.shape[2])
+        self.hasdisplayedLEEMdata = True
+        title = "Real Space LEEM Image: {} eV"
+        energy = LF.filenumber_to_energy(self.leemdat.elist, self.curLEEMIndex)
+        # self.LEEMimageplotwidget.setTitle(title.format(energy),
+        #                                  **self.labelStyle)
+        self.LEEMimtitle.setText(title.format(energy))
+        self.LEEMimageplotwidget.setFocus()
+
+    def initLEEMImage(self, idx):
+        """Replace the LEEM image item with the frame at index=idx and reset the crosshair."""
         if self.hasdisplayedLEEMdata:
             self.LEEMimageplotwidget.getPlotItem().clear()
 
-        self.curLEEMIndex = self.leemdat.dat3d.shape[2]//2
-        self.LEEMimage = pg.ImageItem(self.leemdat.dat3d[:,
-                                                         :,
-                                                         self.curLEEMIndex])
+        self.curLEEMIndex = idx
+        if self.LEEMprefetch is not None:
+            self.LEEMprefetch.stop()
+        self.LEEMprefetch = FramePrefetcher(self.leemdat, ahead=self.exp.prefetch,
+                                            cache_bytes=self.prefetchBytes)
+        self.LEEMpyramid = LF.ImagePyramid(self.LEEMprefetch.get, self.leemdat.shape)
+        vb = self.LEEMimageplotwidget.getPlotItem().getViewBox()
+        ht, wd = self.LEEMpyramid.shape
+        self.LEEMlevel = self.LEEMpyramid.level_for_scale(
+            max(ht / max(vb.height(), 1), wd / max(vb.width(), 1)))
+        self.LEEMimage = pg.ImageItem()
+        self.setLEEMImage(self.curLEEMIndex)
         self.LEEMimageplotwidget.addItem(self.LEEMimage)
         self.LEEMimageplotwidget.hideAxis('bottom')
         self.LEEMimageplotwidget.hideAxis('left')
@@ -839,56 +1048,28 @@ class Viewer(QtWidgets.QWidget):
         self.LEEMimageplotwidget.addItem(self.crosshair.vline,
                                          ignoreBounds=True)
 
-        self.leemdat.elist = [self.exp.mine]
-        while len(self.leemdat.elist) < self.leemdat.dat3d.shape[2]:
-            nextEnergy = self.leemdat.elist[-1] + self.exp.stepe
-            self.leemdat.elist.append(round(nextEnergy, 2))
-        self.checkDataSize(datatype="LEEM")
-        self.hasdisplayedLEEMdata = True
-        title = "Real Space LEEM Image: {} eV"
-        energy = LF.filenumber_to_energy(self.leemdat.elist, self.curLEEMIndex)
-        # self.LEEMimageplotwidget.setTitle(title.format(energy),
-        #                                  **self.labelStyle)
-        self.LEEMimtitle.setText(title.format(energy))
-        self.LEEMimageplotwidget.setFocus()
-
     @QtCore.pyqtSlot()
     def update_LEED_img_after_load(self):
         """Called upon data loading I/O thread emitting finished signal."""
         # if self.hasdisplayedLEEDdata:
         #     self.LEEDimageplotwidget.getPlotItem().clear()
-        self.curLEEDIndex = self.leeddat.dat3d.shape[2]//2
-        self.LEEDimage = pg.ImageItem(self.leeddat.dat3d[:,
-                                                         :,
-                                                         self.curLEEDIndex])
+        self.curLEEDIndex = self.leeddat.shape[2]//2
+        if self.LEEDprefetch is not None:
+            self.LEEDprefetch.stop()
+        self.LEEDprefetch = FramePrefetcher(self.leeddat, ahead=self.exp.prefetch,
+                                            cache_bytes=self.prefetchBytes)
+        self.LEEDimage = pg.ImageItem(self.LEEDprefetch.get(self.curLEEDIndex))
         self.LEEDimagewidget.addItem(self.LEEDimage)
         self.LEEDimagewidget.hideAxis('bottom')
         self.LEEDimagewidget.hideAxis('left')
 
-        self.leeddat.elist = [self.exp.mine]
-        while len(self.leeddat.elist) < self.leeddat.dat3d.shape[2]:
-            newEnergy = self.leeddat.elist[-1] + self.exp.stepe
-            self.leeddat.elist.append(round(newEnergy, 2))
+        self.leeddat.elist = getattr(self.leeddat.dat3d, 'elist', None) or \
+            LF.gen_energy_list(self.exp.mine, self.exp.stepe, self.leeddat.shape[2])
         self.hasdisplayedLEEDdata = True
         title = "Reciprocal Space LEED Image: {} eV"
         energy = LF.filenumber_to_energy(self.leeddat.elist, self.curLEEDIndex)
         self.LEEDTitle.setText(title.format(energy))
 
-    def checkDataSize(self, datatype=None):
-        """Ensure helper array sizes all match main data array size."""
-        if datatype is None:
-            return
-        elif datatype == 'LEEM':
-            mainshape = self.leemdat.dat3d.shape
-            if self.leemdat.dat3ds.shape != mainshape:
-                self.leemdat.dat3ds = np.zeros(mainshape)
-            if self.leemdat.posMask.shape != (mainshape[0], mainshape[1]):
-                self.leemdat.posMask = np.zeros((mainshape[0], mainshape[1]))
-        elif datatype == 'LEED':
-            pass
-        else:
-            return
-
     def handleLEEMClick(self, event):
         """User click registered in LEEMimage area.
 
@@ -919,14 +1100,16 @@ class Viewer(QtWidgets.QWidget):
             self.LEEMselections = []
 
         pos = event.pos()
-        mappedPos = self.LEEMimage.mapFromScene(pos)
+        # map through the view rather than the image item so that coordinates
+        # are in full resolution pixels regardless of the displayed pyramid level
+        mappedPos = self.LEEMimageplotwidget.getPlotItem().getViewBox().mapSceneToView(pos)
         xmapfs = int(mappedPos.x())
         ymapfs = int(mappedPos.y())
 
         if xmapfs < 0 or \
-           xmapfs > self.leemdat.dat3d.shape[1] or \
+           xmapfs > self.leemdat.shape[1] or \
            ymapfs < 0 or \
-           ymapfs > self.leemdat.dat3d.shape[0]:
+           ymapfs > self.leemdat.shape[0]:
             return  # discard click events originating outside the image
 
         if self.currentLEEMPos is not None:
@@ -936,10 +1119,11 @@ class Viewer(QtWidgets.QWidget):
                 ymp = self.currentLEEMPos[1]  # x and y in data coordinates
             except IndexError:
                 return
-        xdata = self.leemdat.elist
-        ydata = self.leemdat.dat3d[ymp, xmp, :]
-        if self.smoothLEEMplot:
-            ydata = LF.smooth(ydata, window_len=self.LEEMWindowLen, window_type=self.LEEMWindowType)
+        nloaded = self.leemdat.nloaded
+        xdata = self.leemdat.elist[:nloaded]
+        ydata = self.leemdat.curve(ymp, xmp)[:nloaded]
+        if self.smoothLEEMplot and not (self.LEEMloading or self.LEEMwatching):
+            ydata = self.LEEMsmoother(ydata)
 
         brush = QtGui.QBrush(self.qcolors[self.LEEMclicks - 1])
         rad = 8
@@ -972,13 +1156,13 @@ class Viewer(QtWidgets.QWidget):
                 return
         # else pos is a QPointF object which can be mapped directly
 
-        mappedPos = self.LEEMimage.mapFromScene(pos)
+        mappedPos = self.LEEMimageplotwidget.getPlotItem().getViewBox().mapSceneToView(pos)
         xmp = int(mappedPos.x())
         ymp = int(mappedPos.y())
         if xmp < 0 or \
-           xmp > self.leemdat.dat3d.shape[1] - 1 or \
+           xmp > self.leemdat.shape[1] - 1 or \
            ymp < 0 or \
-           ymp > self.leemdat.dat3d.shape[0] - 1:
+           ymp > self.leemdat.shape[0] - 1:
             return  # discard  movement events originating outside the image
 
         # update crosshair
@@ -987,26 +1171,116 @@ class Viewer(QtWidgets.QWidget):
         self.crosshair.hline.setPos(ymp)
         self.currentLEEMPos = (xmp, ymp)  # used for handleLEEMClick()
         # print("Mouse moved to: {0}, {1}".format(xmp, ymp))
-
-        # update IV plot
-        xdata = self.leemdat.elist
-        ydata = self.leemdat.dat3d[ymp, xmp, :]  # raw unsmoothed data
-        if self.smoothLEEMplot and not self.leemdat.posMask[ymp, xmp]:
-            # We want to plot smoothed dat but the I(V) of the current pixel position
-            # has not yet been smoothed
-            ydata = LF.smooth(ydata, window_type=self.LEEMWindowType, window_len=self.LEEMWindowLen)
-            self.leemdat.dat3ds[ymp, xmp, :] = ydata
-            self.leemdat.posMask[ymp, xmp] = 1
-
-        elif self.smoothLEEMplot and self.leemdat.posMask[ymp, xmp]:
-            # We want to plot smoothed data and have already calculated it for this pixel position
-            ydata = self.leemdat.dat3ds[ymp, xmp, :]
+        self.plotLEEMIV(xmp, ymp)
+
+    def plotLEEMIV(self, xmp, ymp):
+        """Update the live I(V) plot with the curve from pixel (xmp, ymp)."""
+        nloaded = self.leemdat.nloaded
+        xdata = self.leemdat.elist[:nloaded]
+        ydata = self.leemdat.curve(ymp, xmp)[:nloaded]  # raw unsmoothed data
+        if self.LEEMloading or self.LEEMwatching:
+            # data set is still loading or growing; smooth the energies available
+            # so far without caching the result as the curve is incomplete
+            if self.smoothLEEMplot and nloaded > self.LEEMWindowLen:
+                ydata = self.LEEMsmoother(ydata)
+
+        elif self.smoothLEEMplot:
+            # the first curve requested in a tile smooths the whole tile;
+            # later curves in the same tile are looked up
+            cache = self.LEEMsmoothcaches.get(self.leemdat, self.LEEMWindowLen, self.LEEMWindowType)
+            smoothed = cache.curve(ymp, xmp)
+            if smoothed is not None:
+                ydata = smoothed
 
         pen = pg.mkPen(self.qcolors[0], width=3)
         pdi = pg.PlotDataItem(xdata, ydata, pen=pen)
         self.LEEMivplotwidget.getPlotItem().clear()
         self.LEEMivplotwidget.getPlotItem().addItem(pdi, clear=True)
 
+    def toggleLEEMWatch(self, enable):
+        """Start or stop appending newly acquired files in the LEEM data directory.
+
+        :param enable: boolean to start (True) or stop (False) watching
+        :return: boolean True if the directory is being watched
+        """
+        if not enable:
+            self.LEEMwatchtimer.stop()
+            if self.LEEMwatching:
+                self.LEEMwatching = False
+                # start smoothed curve caches for the final data set
+                self.LEEMsmoothcaches = SmoothCacheLRU(cache_bytes=self.smoothCacheBytes,
+                                                       dtype=self.exp.smooth_dtype)
+            return False
+        if not self.hasdisplayedLEEMdata or self.LEEMloading or self.exp is None:
+            print("Error: Load a LEEM data set before watching its data directory.")
+            return False
+        if not os.path.isdir(str(self.exp.path)) or self.exp.data_type.lower() == 'chunked':
+            print("Error: Only data sets loaded from a directory of files can be watched.")
+            return False
+
+        if self.exp.data_type.lower() == 'raw':
+            self.LEEMwatchext = '.dat'
+        else:
+            self.LEEMwatchext = self.exp.ext
+        entries = LF.scan_data_files(str(self.exp.path), self.LEEMwatchext)
+        # the loaded data holds the first nloaded files in sorted order
+        # any other files are new and will be appended on the first check
+        self.LEEMwatchfiles = set(name for name, size in entries[:self.leemdat.nloaded])
+        if self.LEEMwatchext == '.dat':
+            self.LEEMwatchsize = entries[0][1]
+            self.LEEMwatchformat = LF.dat_format_string(self.exp.bit, self.exp.byte_order)
+            frame_bytes = np.dtype(self.LEEMwatchformat).itemsize*self.exp.imh*self.exp.imw
+            self.LEEMwatchheader = self.LEEMwatchsize - frame_bytes
+        self.LEEMstack = LF.GrowableStack(self.leemdat.dat3d)
+        self.leemdat.set_data(self.LEEMstack.data)
+        self.LEEMwatching = True
+        self.LEEMwatchtimer.start(WATCH_INTERVAL)
+        print("Watching {} for new data files ...".format(self.exp.path))
+        return True
+
+    def checkLEEMDirectory(self):
+        """Start reading any new complete data files in the watched LEEM directory."""
+        if not self.LEEMwatching:
+            return
+        if self.LEEMscanthread is not None and self.LEEMscanthread.isRunning():
+            return  # previous scan is still reading files
+        ht, wd = self.leemdat.shape[:2]
+        params = dict(path=str(self.exp.path), ext=self.LEEMwatchext,
+                      files=frozenset(self.LEEMwatchfiles), imht=ht, imwd=wd)
+        if self.LEEMwatchext == '.dat':
+            params.update(dtype=self.LEEMwatchformat, size=self.LEEMwatchsize,
+                          hdln=self.LEEMwatchheader)
+        self.LEEMscanthread = WorkerThread(task='SCAN_DIRECTORY', **params)
+        self.LEEMscanthread.connectOutputSignal(self.append_LEEM_files)
+        self.LEEMscanthread.start()
+
+    @QtCore.pyqtSlot(object)
+    def append_LEEM_files(self, found):
+        """Append frames read from the watched LEEM directory by the scanning thread.
+
+        :param found: list of tuples (file name, 2d numpy array or None if the image size does not match)
+        """
+        if not self.LEEMwatching:
+            return  # watching stopped while the files were read
+        shape = self.leemdat.shape[:2]
+        added = 0
+        for name, frame in found:
+            if name in self.LEEMwatchfiles:
+                continue  # read by a scan started before watching was restarted
+            self.LEEMwatchfiles.add(name)
+            if frame is None or frame.shape != shape:
+                print("Skipping new file {} with mismatched image size.".format(name))
+                continue
+            self.LEEMstack.append(frame)
+            self.leemdat.elist.append(round(self.leemdat.elist[-1] + self.exp.stepe, 2))
+            added += 1
+        if not added:
+            return
+        self.leemdat.set_data(self.LEEMstack.data)
+        print("Appended {0} new file(s); data set now has {1} energies.".format(added, self.leemdat.nloaded))
+        if self.currentLEEMPos is not None:
+            self.plotLEEMIV(*self.currentLEEMPos)
+
     def handleLEEDClick(self, event):
         """User click registered in LEEDimage area."""
         if not self.hasdisplayedLEEDdata:
@@ -1027,14 +1301,14 @@ class Viewer(QtWidgets.QWidget):
             self.LEEDrects = []
 
         pos = event.pos()
-        mappedPos = self.LEEMimage.mapFromScene(pos)
+        mappedPos = self.LEEDimage.mapFromScene(pos)
         xmapfs = int(mappedPos.x())
         ymapfs = int(mappedPos.y())
 
         if xmapfs < 0 or \
-           xmapfs > self.leeddat.dat3d.shape[1] or \
+           xmapfs > self.leeddat.shape[1] or \
            ymapfs < 0 or \
-           ymapfs > self.leeddat.dat3d.shape[0]:
+           ymapfs > self.leeddat.shape[0]:
             return  # discard click events originating outside the image
         xp = pos.x()
         yp = pos.y()
@@ -1060,17 +1334,19 @@ class Viewer(QtWidgets.QWidget):
         if not self.hasdisplayedLEEDdata or not self.LEEDrects:
             return
 
-        for idx, tup in enumerate(self.LEEDrects):
+        windows = []
+        for tup in self.LEEDrects:
             center = tup[1].center()
             self.LEEDselections.append((center.y(), center.x()))
             topleft = tup[1].topLeft()
             xtl = int(topleft.x())
             ytl = int(topleft.y())
-            int_window = self.leeddat.dat3d[ytl:ytl+2*self.boxrad+1,
-                                            xtl:xtl+2*self.boxrad+1, :]
-            ilist = [img.sum() for img in np.rollaxis(int_window, 2)]
+            windows.append((ytl, ytl+2*self.boxrad+1, xtl, xtl+2*self.boxrad+1))
+        # read only the integration windows so memory mapped data stays on disk
+        ilists = self.leeddat.integrate(windows)
+        for idx, ilist in enumerate(ilists):
             if self.smoothLEEDplot:
-                ilist = LF.smooth(ilist, window_type=self.LEEDWindowType, window_len=self.LEEDWindowLen)
+                ilist = self.LEEDsmoother(ilist)
             self.LEEDivplotwidget.plot(self.leeddat.elist, ilist, pen=pg.mkPen(self.qcolors[idx], width=2))
 
     def clearLEEDIV(self):
@@ -1084,6 +1360,49 @@ class Viewer(QtWidgets.QWidget):
             self.LEEDselections = []
             self.LEEDclicks = 0
 
+    def smoothLEEMDataSet(self):
+        """Smooth every LEEM I(V) curve in a background thread using all cores.
+
+        The result fills the smoothed data used for the live I(V) plot.
+        """
+        if not self.hasdisplayedLEEMdata or self.LEEMloading or self.LEEMwatching:
+            print("Error: Load a complete LEEM data set before smoothing it.")
+            return
+        if self.LEEMsmooththread is not None and not self.LEEMsmooththread.isFinished():
+            print("Error: The LEEM data set is already being smoothed.")
+            return
+        self.LEEMsmooththread = WorkerThread(task='SMOOTH',
+                                             data=self.leemdat.dat3d,
+                                             window_len=self.LEEMWindowLen,
+                                             window_type=self.LEEMWindowType,
+                                             workers=self.exp.workers,
+                                             dtype=self.exp.smooth_dtype)
+        self.LEEMsmooththread.connectOutputSignal(self.retrieve_LEEM_smoothed)
+        self.LEEMsmooththread.connectProgressSignal(self.update_LEEM_smoothing_progress)
+        self.LEEMsmooththread.start()
+
+    def cancelLEEMSmoothing(self):
+        """Stop smoothing the LEEM data set once the tiles in progress finish."""
+        if self.LEEMsmooththread is not None and not self.LEEMsmooththread.isFinished():
+            self.LEEMsmooththread.cancel()
+
+    @QtCore.pyqtSlot(object, int, int)
+    def update_LEEM_smoothing_progress(self, data, count, total):
+        """Show the number of tiles smoothed so far in the LEEM image title."""
+        self.LEEMimtitle.setText("Smoothing LEEM Data: {0} of {1} tiles".format(count, total))
+
+    @QtCore.pyqtSlot(object)
+    def retrieve_LEEM_smoothed(self, data):
+        """Grab the smoothed data set emitted from the smoothing thread."""
+        params = self.LEEMsmooththread.params
+        if params['data'] is not self.leemdat.dat3d or \
+           (params['window_type'], params['window_len']) != (self.LEEMWindowType, self.LEEMWindowLen):
+            print("LEEM data or smoothing settings changed while smoothing; discarding result.")
+            return
+        self.LEEMsmoothcaches.get(self.leemdat, params['window_len'], params['window_type']).fill(data)
+        title = "Real Space LEEM Image: {} eV"
+        self.LEEMimtitle.setText(title.format(LF.filenumber_to_energy(self.leemdat.elist, self.curLEEMIndex)))
+
     def clearLEEMIV(self):
         """Clear User selections from LEEM image and clear IV plot."""
         self.staticLEEMplot.clear()
@@ -1099,12 +1418,13 @@ class Viewer(QtWidgets.QWidget):
         if self.tabs.currentIndex() == 0 and \
            self.hasdisplayedLEEMdata:
             # handle LEEM navigation
-            maxIdx = self.leemdat.dat3d.shape[2] - 1
+            maxIdx = self.leemdat.nloaded - 1
             minIdx = 0
             if (event.key() == QtCore.Qt.Key_Left) and \
                (self.curLEEMIndex >= minIdx + 1):
                 self.curLEEMIndex -= 1
                 self.showLEEMImage(self.curLEEMIndex)
+                self.LEEMprefetch.update(self.curLEEMIndex, direction=-1)
                 title = "Real Space LEEM Image: {} eV"
                 energy = LF.filenumber_to_energy(self.leemdat.elist,
                                                  self.curLEEMIndex)
@@ -1114,6 +1434,7 @@ class Viewer(QtWidgets.QWidget):
                  (self.curLEEMIndex <= maxIdx - 1):
                 self.curLEEMIndex += 1
                 self.showLEEMImage(self.curLEEMIndex)
+                self.LEEMprefetch.update(self.curLEEMIndex, direction=1)
                 title = "Real Space LEEM Image: {} eV"
                 energy = LF.filenumber_to_energy(self.leemdat.elist,
                                                  self.curLEEMIndex)
@@ -1123,13 +1444,14 @@ class Viewer(QtWidgets.QWidget):
         elif (self.tabs.currentIndex() == 1) and \
              (self.hasdisplayedLEEDdata):
             # handle LEED navigation
-            maxIdx = self.leeddat.dat3d.shape[2] - 1
+            maxIdx = self.leeddat.shape[2] - 1
             minIdx = 0
             if (event.key() == QtCore.Qt.Key_Left) and \
                (self.curLEEDIndex >= minIdx + 1):
                 self.curLEEDIndex -= 1
 
                 self.showLEEDImage(self.curLEEDIndex)
+                self.LEEDprefetch.update(self.curLEEDIndex, direction=-1)
 
                 title = "Reciprocal Space LEED Image: {} eV"
                 energy = LF.filenumber_to_energy(self.leeddat.elist,
@@ -1140,6 +1462,7 @@ class Viewer(QtWidgets.QWidget):
                 self.curLEEDIndex += 1
 
                 self.showLEEDImage(self.curLEEDIndex)
+                self.LEEDprefetch.update(self.curLEEDIndex, direction=1)
 
                 title = "Reciprocal Space LEED Image: {} eV"
                 energy = LF.filenumber_to_energy(self.leeddat.elist,
@@ -1148,15 +1471,35 @@ class Viewer(QtWidgets.QWidget):
 
     def showLEEMImage(self, idx):
         """Display LEEM image from main data array at index=idx."""
-        if idx not in range(self.leemdat.dat3d.shape[2] - 1):
+        if idx not in range(self.leemdat.nloaded):
+            return
+        self.setLEEMImage(idx)
+
+    def setLEEMImage(self, idx):
+        """Display the LEEM frame at index=idx at the current pyramid level.
+
+        The image is scaled to cover the full resolution frame so that view
+        coordinates always correspond to full resolution pixels.
+        """
+        wd, ht = self.LEEMpyramid.rect(self.LEEMlevel)
+        self.LEEMimage.setImage(self.LEEMpyramid.get(idx, self.LEEMlevel))
+        self.LEEMimage.setRect(QtCore.QRectF(0, 0, wd, ht))
+
+    def updateLEEMImageLevel(self, *args):
+        """Switch the displayed pyramid level to match the current zoom of the LEEM image."""
+        if not self.hasdisplayedLEEMdata or self.LEEMpyramid is None:
             return
-        self.LEEMimage.setImage(self.leemdat.dat3d[:, :, idx])
+        vb = self.LEEMimageplotwidget.getPlotItem().getViewBox()
+        level = self.LEEMpyramid.level_for_scale(max(vb.viewPixelSize()))
+        if level != self.LEEMlevel:
+            self.LEEMlevel = level
+            self.setLEEMImage(self.curLEEMIndex)
 
     def showLEEDImage(self, idx):
         """Display LEED image from main data array at index=idx."""
-        if idx not in range(self.leeddat.dat3d.shape[2] - 1):
+        if idx not in range(self.leeddat.shape[2]):
             return
-        self.LEEDimage.setImage(self.leeddat.dat3d[:, :, idx])
+        self.LEEDimage.setImage(self.LEEDprefetch.get(idx))
 
 
 def custom_exception_handler(exc_type, exc_value, exc_traceback):
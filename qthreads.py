@@ -12,11 +12,31 @@ Common tasks for the worker thread will be:
 """
 
 import os
+import threading
+import time
 import LEEMFUNCTIONS as LF
 import numpy as np
+import chunkstore
+import datasource
+import stackcache
 # from detect_peaks import detect_peaks as dp
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+PROGRESS_INTERVAL = 0.2  # minimum seconds between progress signals during loading
+
+
+def write_cache(path, key, data, elist, params):
+    """
+    Write a loaded data set to the data cache, then trim the cache to its size budget
+    Run in a background thread so loaded data is displayed without waiting for the write.
+    """
+    try:
+        fl = stackcache.write_cache(path, key, data, elist=elist, params=params)
+        stackcache.prune_cache(keep=fl)
+    except (IOError, OSError) as e:
+        print(e)
+        print('Warning: unable to write data cache.')
+
 # TODO: Consider splitting to multiple classes for separate tasks
 class WorkerThread(QtCore.QThread):
     """
@@ -37,21 +57,45 @@ class WorkerThread(QtCore.QThread):
         byte: string 'L or 'B' denoting endian-ness of data
         outpath: string path to directory in which to output .dat files
         files: list of strings of file names to be output as raw data to outpath
+        mmap: boolean to memory map raw data or uncompressed TIFF images, or decode other images
+              on demand, instead of reading them into memory
+        workers: integer number of threads/processes used to read data files concurrently
+        cache: boolean to read/write a consolidated binary cache of the loaded data
+        energy: tuple (min energy, energy step) in eV stored alongside cached data
+        progressive: boolean to emit partially loaded data while loading
+        dataobj: LeemData or LeedData object to export to a chunked data file
+        metadata: dictionary of Experiment settings stored in an exported data file
+        window_len: even integer size of smoothing window
+        window_type: string type of smoothing window function
+        dtype: string numpy floating point type of smoothed data, 'float32' or 'float64',
+               or numpy type of raw data when scanning a directory of .dat files
+        size: integer size in bytes of complete .dat files when scanning a directory
+        layout: string memory layout of loaded LEEM data, 'frame' or 'dual'; see datasource.ArraySource
+        hdln: integer header length in bytes of .dat files when scanning a directory
     """
 
     # Pyqt5 Signals must be declared at class level
     done = QtCore.pyqtSignal()
-    outputSIGNAL = QtCore.pyqtSignal(np.ndarray)
+    # output may be a numpy array or an array-like LF.LazyStack
+    outputSIGNAL = QtCore.pyqtSignal(object)
+    # partially loaded data, number of frames loaded, total number of frames
+    # data is None when reporting progress converting files with gen_Dat_Files()
+    progressSIGNAL = QtCore.pyqtSignal(object, int, int)
+    # loading failed; any partially loaded data emitted by progressSIGNAL must be discarded
+    errorSIGNAL = QtCore.pyqtSignal(str)
 
     def __init__(self, task=None, **kwargs):
         super(WorkerThread, self).__init__()
         self.task = task
         # Get parameters as dictionary and validate against keys
         self.params = kwargs
+        self.cancelled = False  # set by cancel() to abandon a long running task
         # path refers to input data path
         # output data path is labeled as outpath
         self.valid_keys = ['path', 'data', 'ilist', 'elist',
-                           'imht', 'imwd', 'name', 'bits', 'ext', 'byte', 'outpath', 'files']
+                           'imht', 'imwd', 'name', 'bits', 'ext', 'byte', 'outpath', 'files', 'mmap', 'workers',
+                           'cache', 'energy', 'progressive', 'dataobj', 'metadata',
+                           'window_len', 'window_type', 'dtype', 'size', 'hdln', 'layout']
         for key in self.params.keys():
             if key not in self.valid_keys:
                 print('Terminating - ERROR Invalid Task Parameter: {}'.format(key))
@@ -68,6 +112,42 @@ class WorkerThread(QtCore.QThread):
         """
         self.outputSIGNAL.connect(slot)
 
+    def cancel(self):
+        """
+        Request that a long running task stop at the next opportunity
+        Only the SMOOTH task checks for cancellation.
+        """
+        self.cancelled = True
+
+    def connectErrorSignal(self, slot):
+        """
+        callable from gui.py to connect the errorSIGNAL to various slots
+        """
+        self.errorSIGNAL.connect(slot)
+
+    def connectProgressSignal(self, slot):
+        """
+        callable from gui.py to connect the progressSIGNAL to various slots
+        """
+        self.progressSIGNAL.connect(slot)
+
+    def progress_callback(self):
+        """
+        Generate a callback for the LF loading functions which emits progressSIGNAL
+        Signals are rate limited so the GUI is not flooded while loading many small files.
+        :return: callable(data, count) or None if the 'progressive' parameter is not set
+        """
+        if not self.params.get('progressive', False):
+            return None
+        last = [0.0]  # time of last emitted signal
+
+        def report(data, count):
+            now = time.time()
+            if count == data.shape[2] or now - last[0] > PROGRESS_INTERVAL:
+                last[0] = now
+                self.progressSIGNAL.emit(data, count, data.shape[2])
+        return report
+
     def run(self):
         """
         # Overload the QThread run() method to do specific tasks
@@ -118,6 +198,21 @@ class WorkerThread(QtCore.QThread):
             self.quit()
             self.exit()  # restrict action to one task
 
+        elif self.task == 'LOAD_CHUNKED':
+            self.load_Chunked()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'EXPORT_CHUNKED':
+            self.export_Chunked()
+            self.quit()
+            self.exit()  # restrict action to one task
+
+        elif self.task == 'SCAN_DIRECTORY':
+            self.scan_Directory()
+            self.quit()
+            self.exit()  # restrict action to one task
+
         else:
             print('Terminating: Unknown task ...')
             self.quit()
@@ -147,17 +242,28 @@ class WorkerThread(QtCore.QThread):
             self.params['byte'] = 'L'  # default to Little Endian
 
         # load raw data
-        dat_3d = LF.process_LEEM_Data(dirname=self.params['path'],
-                                      ht=self.params['imht'],
-                                      wd=self.params['imwd'],
-                                      bits=self.params['bits'],
-                                      byte=self.params['byte'])
+        if self.params.get('mmap', False):
+            loader = lambda: LF.map_LEEM_Data(dirname=self.params['path'],
+                                              ht=self.params['imht'],
+                                              wd=self.params['imwd'],
+                                              bits=self.params['bits'],
+                                              byte=self.params['byte'])
+        else:
+            loader = lambda: LF.process_LEEM_Data(dirname=self.params['path'],
+                                                  ht=self.params['imht'],
+                                                  wd=self.params['imwd'],
+                                                  bits=self.params['bits'],
+                                                  byte=self.params['byte'],
+                                                  workers=self.params.get('workers', None))
+        dat_3d = self.load_with_cache(loader, '.dat')
+        if dat_3d is None:
+            return
 
         # emit output signal with np array as generic pyobject type
         # Old way:
         # self.emit(QtCore.SIGNAL('output(PyQt_PyObject)'), dat_3d)
         # New Way:
-        self.outputSIGNAL.emit(dat_3d) # type: np.ndarray
+        self.outputSIGNAL.emit(dat_3d) # type: np.ndarray or LF.LazyStack
 
     def load_LEED_Images(self):
         """
@@ -182,7 +288,15 @@ class WorkerThread(QtCore.QThread):
                 swap = False
                 print("Error reading byte order from experimental config ...")
         """
-        data = LF.get_img_array(self.params['path'], ext=self.params['ext'], swap=False)
+        data = None
+        if self.params.get('mmap', False):
+            data = self.map_Images()
+        if data is None:
+            data = self.load_with_cache(lambda: LF.get_img_array(self.params['path'],
+                                                                 ext=self.params['ext'],
+                                                                 swap=False,
+                                                                 workers=self.params.get('workers', None)),
+                                        self.params['ext'])
         if data is None:
             self.quit()
             self.exit()
@@ -216,17 +330,36 @@ class WorkerThread(QtCore.QThread):
             self.params['byte'] = 'L'  # default to Little Endian
 
         # load raw data
-        dat_3d = LF.process_LEEM_Data(dirname=self.params['path'],
-                                      ht=self.params['imht'],
-                                      wd=self.params['imwd'],
-                                      bits=self.params['bits'],
-                                      byte=self.params['byte'])
+        if self.params.get('mmap', False):
+            loader = lambda: LF.map_LEEM_Data(dirname=self.params['path'],
+                                              ht=self.params['imht'],
+                                              wd=self.params['imwd'],
+                                              bits=self.params['bits'],
+                                              byte=self.params['byte'])
+        else:
+            loader = lambda: LF.process_LEEM_Data(dirname=self.params['path'],
+                                                  ht=self.params['imht'],
+                                                  wd=self.params['imwd'],
+                                                  bits=self.params['bits'],
+                                                  byte=self.params['byte'],
+                                                  workers=self.params.get('workers', None),
+                                                  callback=self.progress_callback())
+        try:
+            dat_3d = self.load_with_cache(loader, '.dat')
+        except (IOError, OSError, ValueError, LF.ParseError) as e:
+            print(e)
+            print('Error occurred while loading LEEM data using a QThread')
+            self.errorSIGNAL.emit(str(e))
+            return
+        if dat_3d is None:
+            self.errorSIGNAL.emit('No LEEM data was loaded')
+            return
 
         # emit output signal with np array as generic pyobject type
         # Old way:
         # self.emit(QtCore.SIGNAL('output(PyQt_PyObject)'), dat_3d)
         # New Way:
-        self.outputSIGNAL.emit(dat_3d) # type: np.ndarray
+        self.outputSIGNAL.emit(self.arrange_layout(dat_3d)) # type: np.ndarray, LF.LazyStack or datasource.DataSource
 
     def load_LEEM_Images(self):
         """
@@ -237,22 +370,169 @@ class WorkerThread(QtCore.QThread):
             print('Required Parameters: path, ext')
         print('Loading LEEM Data from Images via QThread ...')
         try:
-            data = LF.get_img_array(self.params['path'],
-                                    ext=self.params['ext'])
-        except IOError as e:
+            data = None
+            if self.params.get('mmap', False):
+                data = self.map_Images()
+            if data is None:
+                data = self.load_with_cache(lambda: LF.get_img_array(self.params['path'],
+                                                                     ext=self.params['ext'],
+                                                                     workers=self.params.get('workers', None),
+                                                                     callback=self.progress_callback()),
+                                            self.params['ext'])
+        except (IOError, OSError, ValueError, LF.ParseError) as e:
             print(e)
             print('Error occurred while loading LEEM data from images using a QThread')
+            self.errorSIGNAL.emit(str(e))
             return
-        except ValueError as e:
-            print(e)
-            print('Error occurred while loading LEEM data from images using a QThread')
+        if data is None:
+            self.errorSIGNAL.emit('No LEEM data was loaded')
             return
 
         # emit output signal with np array as generic pyobject type
         # Old way:
         # self.emit(QtCore.SIGNAL('output(PyQt_PyObject)'), data)
         # New Way:
-        self.outputSIGNAL.emit(data) # type: np.ndarray
+        self.outputSIGNAL.emit(self.arrange_layout(data)) # type: np.ndarray, LF.LazyStack or datasource.DataSource
+
+    def arrange_layout(self, data):
+        """
+        Store loaded data in the memory layout given by the 'layout' parameter
+        The 'dual' layout copies in memory data into a second layout; this is
+        done here so the GUI does not block while the copy is made.
+        :param data: 3d numpy array or array-like returned by a loader
+        :return: data unchanged for the 'frame' layout, otherwise a datasource.DataSource
+        """
+        layout = self.params.get('layout', 'frame')
+        if layout == 'frame':
+            return data
+        return datasource.open_source(data, layout=layout)
+
+    def map_Images(self):
+        """
+        Open image files without reading them all into memory
+        Uncompressed TIFF pixel data is mapped in place; other images are
+        decoded only when a frame or I(V) curve touching them is requested.
+        :return: LF.LazyStack or None if no images are found
+        """
+        data = None
+        if self.params['ext'] in ['.tif', '.tiff']:
+            data = LF.map_tiff_stack(self.params['path'], self.params['ext'])
+        if data is None and os.path.isdir(self.params['path']):
+            data = LF.image_stack(self.params['path'], self.params['ext'],
+                                  workers=self.params.get('workers', None))
+        return data
+
+    def load_with_cache(self, loader, ext):
+        """
+        Load data via a consolidated binary cache if the 'cache' parameter is set
+        A valid cache is memory mapped directly; otherwise the data is loaded
+        by calling loader() and written to the cache for subsequent loads by a
+        background thread, so the data can be displayed while it is written.
+        :param loader: callable with no arguments returning the loaded 3d data or None
+        :param ext: string file extension of the source data files
+        :return: 3d numpy array or array-like, or None if loading failed
+        """
+        path = self.params['path']
+        if not self.params.get('cache', False) or not os.path.isdir(path):
+            # multi-page TIFF files are already read lazily in place
+            return loader()
+        if ext in ['.tif', '.tiff']:
+            # get_img_array() falls back on the alternate tiff extension
+            ext = ('.tif', '.tiff')
+        params = {key: self.params.get(key) for key in ['imht', 'imwd', 'bits', 'byte', 'ext', 'energy']}
+        try:
+            key = stackcache.cache_key(path, ext, params)
+            cached = stackcache.read_cache(path, key)
+        except (IOError, OSError) as e:
+            print(e)
+            print('Error checking data cache; loading from source files ...')
+            return loader()
+        if cached is not None:
+            print('Loading data from cache ...')
+            return cached[0]
+
+        data = loader()
+        if data is None:
+            return None
+        elist = None
+        if self.params.get('energy') is not None:
+            mine, stepe = self.params['energy']
+            elist = LF.gen_energy_list(mine, stepe, data.shape[2])
+        # the data is emitted and displayed while the cache is written
+        writer = threading.Thread(target=write_cache, args=(path, key, data, elist, params))
+        writer.daemon = True  # an unfinished cache file is left under a temporary name
+        writer.start()
+        return data
+
+    def load_Chunked(self):
+        """
+        Open a chunked data file written by export_Chunked()
+        Data is decompressed on demand as frames and I(V) curves are requested.
+        :return: none
+        """
+        # requires params: path
+        try:
+            data = chunkstore.load_dataset(self.params['path'])
+        except (IOError, OSError, ValueError, LF.ParseError) as e:
+            print(e)
+            print('Error loading chunked data file {}'.format(self.params['path']))
+            self.errorSIGNAL.emit(str(e))
+            return
+        self.outputSIGNAL.emit(data)  # type: chunkstore.ChunkedStack
+
+    def scan_Directory(self):
+        """
+        Read data files in a watched directory which are not yet part of the data set
+        Files are read in sorted order and scanning stops at the first file which is
+        still being written so that energies stay in order.
+        emits a list of tuples (file name, 2d numpy array) with array None for files
+        whose image size does not match (imht, imwd)
+        """
+        # requires params: path, ext, files, imht, imwd
+        # .dat files also require: dtype, size, hdln
+        reqs = ['path', 'ext', 'files', 'imht', 'imwd']
+        for req in reqs:
+            if req not in self.params.keys():
+                print("Error: Required Parameter {} is missing from call to scan_Directory() ...".format(req))
+                return
+        path = self.params['path']
+        ext = self.params['ext']
+        shape = (self.params['imht'], self.params['imwd'])
+        found = []
+        for name, size in LF.scan_data_files(path, ext):
+            if name in self.params['files']:
+                continue
+            try:
+                if ext == '.dat':
+                    if size != self.params['size']:
+                        break  # file is still being written; keep energy order
+                    frame = LF.read_dat_into(os.path.join(path, name),
+                                             np.empty(shape, dtype=self.params['dtype']),
+                                             hdln=self.params['hdln'])
+                else:
+                    frame = LF.decode_img(os.path.join(path, name))
+            except (IOError, OSError, SyntaxError, ValueError, LF.ParseError):
+                break  # file is incomplete; try again on the next scan
+            found.append((name, frame if frame.shape == shape else None))
+        if found:
+            self.outputSIGNAL.emit(found)  # type: list
+
+    def export_Chunked(self):
+        """
+        Write a loaded data set to a chunked, compressed data file
+        :return: none
+        """
+        # requires params: dataobj, name
+        filename = self.params['name']
+        print('Writing data set to file {} ...'.format(filename))
+        try:
+            chunkstore.save_dataset(self.params['dataobj'], filename,
+                                    metadata=self.params.get('metadata'))
+        except (IOError, OSError) as e:
+            print(e)
+            print('Error writing chunked data file {}'.format(filename))
+            return
+        self.done.emit()
 
     def output_to_Text(self):
         """
@@ -270,11 +550,28 @@ class WorkerThread(QtCore.QThread):
                 f.write(str(item) + '\t' + str(ilist[index]) + '\n')
 
     def smooth(self):
+        """
+        Smooth every I(V) curve of a data set in parallel over spatial tiles
+        progressSIGNAL is emitted with data None and the number of tiles completed.
+        :return: none
+        """
         if 'data' not in self.params.keys():
             print('Terminating - ERROR: incorrect parameters for smooth task')
             print('Required Parameters: data - 3d numpy array')
             return
-        smth = np.apply_along_axis(LF.smooth, 2, self.params['data'], window_len=10, window_type='flat')
+
+        def report(count, total):
+            self.progressSIGNAL.emit(None, count, total)
+
+        smth = LF.smooth_cube_parallel(self.params['data'],
+                                       window_len=self.params.get('window_len', 10),
+                                       window_type=self.params.get('window_type', 'flat'),
+                                       workers=self.params.get('workers'),
+                                       callback=report,
+                                       cancel=lambda: self.cancelled,
+                                       dtype=self.params.get('dtype', 'float64'))
+        if smth is None:
+            return  # invalid settings or cancelled
         # self.emit(QtCore.SIGNAL('output(PyQt_PyObject)'), smth)
         self.outputSIGNAL.emit(smth)  # type: np.ndarray
 
@@ -301,19 +598,30 @@ class WorkerThread(QtCore.QThread):
         h = self.params['imht']
         w = self.params['imwd']
         bits = self.params['bits']
-        byte_order = self.params['byte']
 
         if bits == 16 or bits == 2:
             bytes_per_pixel = 2
         elif bits == 8 or bits == 1:
             bytes_per_pixel = 1
 
-        for file in files:
-            with open(os.path.join(indir, file), 'rb') as infile:
-                header = len(infile.read()) - bytes_per_pixel * w * h
-                infile.seek(0)
-                fmtstr = byte_order + 'u' + str(bytes_per_pixel)
-                data = np.fromstring(infile.read()[header:], fmtstr).reshape((h, w))
-                with open(os.path.join(outdir, file.split('.')[0]+'.dat'), 'wb') as outfile:
-                    data.tofile(outfile)
+        # header length from file sizes, or read from the IFD of each TIFF file
+        payload = bytes_per_pixel * w * h
+        try:
+            header = LF.dat_header(indir, files, payload)
+        except LF.ParseError as e:
+            print("Error: " + e.message)
+            return
+
+        last = [0.0]  # time of last emitted signal
+
+        def report(count, total):
+            # no data accompanies conversion progress
+            now = time.time()
+            if count == total or now - last[0] > PROGRESS_INTERVAL:
+                last[0] = now
+                self.progressSIGNAL.emit(None, count, total)
+
+        # pixel data is copied verbatim so byte order is preserved
+        LF.convert_to_dat(indir, outdir, files, header, payload,
+                          workers=self.params.get('workers'), callback=report)
         self.done.emit()
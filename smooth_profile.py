@@ -2,6 +2,7 @@ import numpy as np
 import time
 import os
 from numba import jit
+import LEEMFUNCTIONS as LF
 
 
 def loadData(path):
@@ -98,6 +99,22 @@ def main():
     sdata = np.apply_along_axis(smooth, 2, data)
     print('Time to smooth array using apply_along_axis: {}'.format(time.time() - ts))
 
+    ts = time.time()
+    scube = LF.smooth_cube(data, window_len=10, window_type='flat')
+    print('Time to smooth array using vectorized smooth_cube: {}'.format(time.time() - ts))
+    print('smooth_cube matches apply_along_axis: {}'.format(np.allclose(scube, sdata)))
+
+    for window_len in [10, 40, 100]:
+        ts = time.time()
+        sdirect = LF.smooth_cube(data, window_len=window_len, window_type='hanning', method='direct')
+        tdirect = time.time() - ts
+        ts = time.time()
+        sfft = LF.smooth_cube(data, window_len=window_len, window_type='hanning', method='fft')
+        tfft = time.time() - ts
+        print('Hanning window {}: direct {} s, FFT {} s, auto selects {}, results match: {}'.format(
+            window_len, tdirect, tfft, LF.smooth_method(window_len, data.shape[2]),
+            np.allclose(sdirect, sfft)))
+
     ts = time.time()
     snumba = smooth_loop(data)
     print('Time to smooth array using nested loops with numba: {}'.format(time.time() - ts))
@@ -0,0 +1,165 @@
+"""
+Cache of smoothed I(V) curves filled one spatial tile at a time.
+
+Hovering over a LEEM image plots the smoothed I(V) curve of the pixel
+under the mouse. Smoothing each pixel separately as it is visited costs a
+python call per pixel, so moving the mouse across the image leads to
+thousands of tiny smoothing calls. Instead, the first time any pixel of a
+tile is requested, the whole tile (TILE x TILE pixels) is read through the
+data container and smoothed with LF.smooth_cube(). A small boolean bitmap
+with one entry per tile records which tiles are done, so later requests
+anywhere in that tile are plain lookups. Only smoothed tiles are stored,
+in float32 by default, so no memory is used until smoothing is requested.
+
+SmoothCacheLRU keeps the tile caches of the last few smoothing settings used
+on each data set, within a memory budget, so switching back to a previous
+window type or length reuses the curves already smoothed.
+"""
+import itertools
+from collections import OrderedDict
+import numpy as np
+import LEEMFUNCTIONS as LF
+
+TILE = 32  # rows and columns of pixels smoothed together
+DEF_CACHE_BYTES = 1024**3  # memory budget for smoothed tiles kept by SmoothCacheLRU
+
+_dataset_ids = itertools.count(1)
+
+
+def dataset_id(dataobj):
+    """
+    Identify the data set currently held by a container
+    Every data source is numbered once, so a data set loaded later never
+    shares an id with an earlier one even if it reuses the same memory.
+    :param dataobj: LeemData/LeedData container or datasource.DataSource
+    :return: integer id of the data set
+    """
+    source = getattr(dataobj, 'source', dataobj)
+    sid = getattr(source, 'dataset_id', None)
+    if sid is None:
+        sid = source.dataset_id = next(_dataset_ids)
+    return sid
+
+
+class SmoothTileCache(object):
+    """
+    Smoothed copy of a 3d data set (row, col, energy) computed on demand by tile
+    Only tiles which have been smoothed are held in memory, each in its own
+    array of the chosen floating point type, so creating a cache costs
+    nothing until curves are requested.
+    """
+
+    def __init__(self, dataobj, window_len=10, window_type='flat', tile=TILE, dtype=np.float32):
+        """
+        :param dataobj: LeemData/LeedData container or datasource.DataSource holding the raw data
+        :param window_len: even integer size of smoothing window
+        :param window_type: string for type of window function
+        :param tile: integer number of rows and columns in each tile
+        :param dtype: numpy floating point type of the smoothed data, float32 or float64
+        """
+        self.dataobj = dataobj
+        self.shape = tuple(dataobj.shape)
+        self.window_len = window_len
+        self.window_type = window_type
+        self.tile = tile
+        self.dtype = np.dtype(dtype)
+        ht, wd = self.shape[:2]
+        self.done = np.zeros((-(-ht // tile), -(-wd // tile)), dtype=bool)
+        self._tiles = {}  # (tile row, tile col) -> 3d array of smoothed curves
+
+    @property
+    def nbytes(self):
+        """Size in bytes of the smoothed tiles held by the cache"""
+        return sum(arr.nbytes for arr in self._tiles.values())
+
+    def curve(self, r, c):
+        """
+        :param r: integer row (y) coordinate
+        :param c: integer column (x) coordinate
+        :return: 1d array of smoothed intensity vs energy at pixel (r, c), or None if the settings are invalid
+        """
+        tr, tc = r // self.tile, c // self.tile
+        if not self.done[tr, tc] and not self.fill_tile(tr, tc):
+            return None
+        return self._tiles[(tr, tc)][r - tr*self.tile, c - tc*self.tile, :]
+
+    def fill_tile(self, tr, tc):
+        """
+        Smooth every curve in one tile
+        :param tr: integer tile row
+        :param tc: integer tile column
+        :return: boolean True if the tile was smoothed
+        """
+        r0, c0 = tr*self.tile, tc*self.tile
+        block = self.dataobj.window(r0, r0 + self.tile, c0, c0 + self.tile)
+        out = np.empty(block.shape, dtype=self.dtype)
+        if LF.smooth_cube(block, window_len=self.window_len, window_type=self.window_type, out=out) is None:
+            return False
+        self._tiles[(tr, tc)] = out
+        self.done[tr, tc] = True
+        return True
+
+    def fill(self, smth):
+        """
+        Store a fully smoothed data set, e.g. from LF.smooth_cube_parallel()
+        Tiles are views of smth when it already has the cache's dtype.
+        :param smth: 3d numpy array of smoothed data with the shape of the data set
+        """
+        smth = smth.astype(self.dtype, copy=False)
+        grid_ht, grid_wd = self.done.shape
+        for tr in range(grid_ht):
+            for tc in range(grid_wd):
+                r0, c0 = tr*self.tile, tc*self.tile
+                self._tiles[(tr, tc)] = smth[r0:r0 + self.tile, c0:c0 + self.tile]
+        self.done.fill(True)
+
+    def clear(self):
+        """Forget all smoothed tiles."""
+        self._tiles.clear()
+        self.done.fill(False)
+
+
+class SmoothCacheLRU(object):
+    """
+    Tile caches keyed by (window type, window length, data set id)
+    Caches are kept in least recently used order and the oldest are dropped
+    once the smoothed tiles held by all caches exceed the memory budget. The
+    cache most recently requested is always kept.
+    """
+
+    def __init__(self, cache_bytes=DEF_CACHE_BYTES, tile=TILE, dtype=np.float32):
+        """
+        :param cache_bytes: integer memory budget in bytes for smoothed tiles
+        :param tile: integer number of rows and columns in each tile
+        :param dtype: numpy floating point type of the smoothed data, float32 or float64
+        """
+        self.cache_limit = cache_bytes
+        self.tile = tile
+        self.dtype = np.dtype(dtype)
+        self._caches = OrderedDict()
+
+    def get(self, dataobj, window_len, window_type):
+        """
+        :param dataobj: LeemData/LeedData container or datasource.DataSource holding the raw data
+        :param window_len: even integer size of smoothing window
+        :param window_type: string for type of window function
+        :return: SmoothTileCache for the data set and smoothing settings
+        """
+        key = (window_type, window_len, dataset_id(dataobj))
+        cache = self._caches.pop(key, None)
+        if cache is None:
+            cache = SmoothTileCache(dataobj, window_len=window_len, window_type=window_type,
+                                    tile=self.tile, dtype=self.dtype)
+        self._caches[key] = cache  # most recently used
+        self.trim()
+        return cache
+
+    def trim(self):
+        """Drop the least recently used caches until the rest fit in the memory budget."""
+        total = sum(cache.nbytes for cache in self._caches.values())
+        while len(self._caches) > 1 and total > self.cache_limit:
+            total -= self._caches.popitem(last=False)[1].nbytes
+
+    def clear(self):
+        """Drop all caches."""
+        self._caches.clear()
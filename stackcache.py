@@ -0,0 +1,200 @@
+"""
+Persistent cache of loaded LEEM and LEED data sets.
+
+After a data set is loaded the full 3d stack is written to a single
+contiguous binary file so that later loads of the same Experiment can
+memory map it directly instead of parsing hundreds of individual files.
+
+Each cache file is keyed by the data path, the list of data files along
+with their sizes and modification times, and the parameters used to load
+them. Any change to the source directory produces a different key and
+the stale cache is ignored and overwritten on the next load.
+
+Cache files of least recently loaded data sets are deleted once the cache
+directory exceeds MAX_CACHE_BYTES; see prune_cache(). The whole cache can
+be removed at any time by deleting CACHE_DIR.
+
+Cache File Layout:
+    8 bytes     magic string b'PLEASEC1'
+    8 bytes     little endian unsigned integer length of the JSON header
+    N bytes     utf-8 JSON header: key, shape, dtype, energy list, load parameters
+    padding     zero bytes up to the next multiple of ALIGN
+    data        raw pixel data stored energy-major (energy, row, column) in C order
+"""
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b'PLEASEC1'
+ALIGN = 4096  # align pixel data to page boundaries for memory mapping
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.please', 'cache')
+MAX_CACHE_BYTES = 16*1024**3  # total size of cache files kept in the cache directory
+
+
+def cache_key(path, ext, params=None):
+    """
+    Generate a key identifying the current state of a data directory
+    :param path: string path to data directory
+    :param ext: string file extension or tuple of extensions of the data files
+    :param params: dictionary of JSON serializable parameters used to load the data
+    :return: string hex digest
+    """
+    files = []
+    for entry in os.scandir(path):
+        if entry.name.endswith(ext) and not entry.name.startswith(".") and entry.is_file():
+            stat = entry.stat()
+            files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+    files.sort()
+    description = {'path': os.path.abspath(path),
+                   'files': files,
+                   'params': params}
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_path(path, cachedir=None):
+    """
+    :param path: string path to data directory
+    :param cachedir: string path to directory holding cache files, default CACHE_DIR
+    :return: string path to the cache file for the data directory
+    """
+    if cachedir is None:
+        cachedir = CACHE_DIR
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest() + '.stack'
+    return os.path.join(cachedir, name)
+
+
+def read_header(fl):
+    """
+    Read the header of a cache file
+    :param fl: string path to cache file
+    :return: tuple (header dictionary, integer byte offset of pixel data) or None if not a cache file
+    """
+    with open(fl, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        hlen = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(hlen).decode('utf-8'))
+    offset = _data_offset(hlen)
+    return header, offset
+
+
+def read_cache(path, key, cachedir=None):
+    """
+    Memory map a cached data set if a valid cache exists for the given key
+    :param path: string path to data directory
+    :param key: string key generated by cache_key()
+    :param cachedir: string path to directory holding cache files
+    :return: tuple (3d numpy memmap (height, width, energy), header dictionary) or None
+    """
+    fl = cache_path(path, cachedir)
+    if not os.path.exists(fl):
+        return None
+    try:
+        result = read_header(fl)
+    except (IOError, OSError, ValueError, struct.error) as e:
+        print("Warning: unable to read cache file {}".format(fl))
+        print(e)
+        return None
+    if result is None:
+        return None
+    header, offset = result
+    if header.get('key') != key:
+        print("Cached data is out of date; reloading from source files.")
+        return None
+    ht, wd, num = header['shape']
+    dtype = np.dtype(header['dtype'])
+    if os.path.getsize(fl) != offset + ht*wd*num*dtype.itemsize:
+        print("Cache file {} is incomplete; reloading from source files.".format(fl))
+        return None
+    data = np.memmap(fl, dtype=dtype, mode='r', offset=offset, shape=(num, ht, wd))
+    try:
+        os.utime(fl, None)  # mark as recently used for prune_cache()
+    except OSError:
+        pass
+    # (height, width, energy) view of the energy-major data
+    return data.transpose(1, 2, 0), header
+
+
+def write_cache(path, key, data, elist=None, params=None, cachedir=None):
+    """
+    Write a data set to a single contiguous cache file
+    Data is written frame by frame so lazily loaded stacks are never fully resident in memory.
+    The file is written under a temporary name and moved into place once complete.
+
+    :param path: string path to data directory
+    :param key: string key generated by cache_key()
+    :param data: 3d numpy array or array-like (height, width, energy)
+    :param elist: list of energy values corresponding to the third axis of data
+    :param params: dictionary of JSON serializable parameters used to load the data
+    :param cachedir: string path to directory holding cache files
+    :return: string path to the cache file
+    """
+    fl = cache_path(path, cachedir)
+    if not os.path.exists(os.path.dirname(fl)):
+        os.makedirs(os.path.dirname(fl))
+    ht, wd, num = data.shape
+    header = {'key': key,
+              'path': os.path.abspath(path),
+              'shape': [ht, wd, num],
+              'dtype': np.dtype(data.dtype).str,
+              'elist': list(elist) if elist is not None else None,
+              'params': params}
+    hbytes = json.dumps(header).encode('utf-8')
+    offset = _data_offset(len(hbytes))
+
+    tmp = fl + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(hbytes)))
+        f.write(hbytes)
+        f.write(b'\0' * (offset - f.tell()))
+        for idx in range(num):
+            np.ascontiguousarray(data[:, :, idx], dtype=data.dtype).tofile(f)
+    os.replace(tmp, fl)
+    print("Wrote data cache {}".format(fl))
+    return fl
+
+
+def prune_cache(cachedir=None, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """
+    Delete the least recently used cache files until the rest fit within max_bytes
+    Files are ordered by modification time, which read_cache() updates on each use.
+    :param cachedir: string path to directory holding cache files, default CACHE_DIR
+    :param max_bytes: integer total size in bytes of cache files to keep
+    :param keep: optional string path to a cache file which is never deleted
+    :return: list of string paths of deleted files
+    """
+    if cachedir is None:
+        cachedir = CACHE_DIR
+    if not os.path.isdir(cachedir):
+        return []
+    entries = []
+    for entry in os.scandir(cachedir):
+        if entry.name.endswith('.stack') and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    total = sum(size for mtime, size, fl in entries)
+    deleted = []
+    for mtime, size, fl in entries:
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(fl) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(fl)
+        except OSError:
+            continue  # e.g. still memory mapped on Windows
+        total -= size
+        deleted.append(fl)
+    if deleted:
+        print("Removed {} least recently used data cache file(s).".format(len(deleted)))
+    return deleted
+
+
+def _data_offset(hlen):
+    """Byte offset of pixel data following a JSON header of length hlen."""
+    size = len(MAGIC) + 8 + hlen
+    return ((size + ALIGN - 1) // ALIGN) * ALIGN
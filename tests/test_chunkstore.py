@@ -0,0 +1,62 @@
+"""Round trip tests for the chunked .pchunk data format."""
+import numpy as np
+import pytest
+import chunkstore
+import data
+import LEEMFUNCTIONS as LF
+
+
+@pytest.fixture
+def leemdat():
+    dat = data.LeemData()
+    # sizes are not multiples of the chunk shape so edge chunks are partial
+    dat.set_data(np.arange(37*29*11, dtype=np.uint16).reshape(37, 29, 11))
+    dat.elist = [round(20 + 0.5*idx, 2) for idx in range(11)]
+    return dat
+
+
+@pytest.fixture
+def stack(leemdat, tmp_path):
+    fl = str(tmp_path / ('data' + chunkstore.EXT))
+    chunkstore.save_dataset(leemdat, fl, metadata={'Data Type': 'Raw'}, chunks=(16, 8, 4))
+    stack = chunkstore.load_dataset(fl, cache_bytes=4096)
+    yield stack
+    stack.close()
+
+
+def test_round_trip(leemdat, stack):
+    assert stack.shape == leemdat.shape
+    assert stack.dtype == leemdat.dtype
+    assert stack.elist == leemdat.elist
+    assert stack.metadata == {'Data Type': 'Raw'}
+    np.testing.assert_array_equal(stack[:, :, :], leemdat.dat3d)
+
+
+@pytest.mark.parametrize('key', [
+    (slice(None), slice(None), 5),
+    (3, 28, slice(None)),
+    (slice(10, 33), slice(5, 20), slice(2, 9)),
+    (slice(None, None, 3), slice(1, None, 4), slice(None, None, -1)),
+    (-1, -1, -1),
+    (slice(15, 17), 7),
+])
+def test_sliced_reads(leemdat, stack, key):
+    np.testing.assert_array_equal(stack[key], leemdat.dat3d[key])
+
+
+def test_load_into_container(leemdat, stack):
+    dat = data.LeemData()
+    stack = chunkstore.load_dataset(stack.fl, dataobj=dat)
+    try:
+        assert dat.elist == leemdat.elist
+        np.testing.assert_array_equal(dat.frame(4), leemdat.frame(4))
+        np.testing.assert_array_equal(dat.curve(36, 0), leemdat.curve(36, 0))
+    finally:
+        stack.close()
+
+
+def test_not_a_chunked_file(tmp_path):
+    fl = tmp_path / 'bad.pchunk'
+    fl.write_bytes(b'NOTCHUNK' + b'\0'*64)
+    with pytest.raises(LF.ParseError):
+        chunkstore.ChunkedStack(str(fl))
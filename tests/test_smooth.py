@@ -0,0 +1,125 @@
+"""Tests that every smoothing method gives the same curves as LF.smooth()."""
+import numpy as np
+import pytest
+import data
+import LEEMFUNCTIONS as LF
+from smoothcache import SmoothTileCache
+
+WINDOW_LENS = [4, 7, 10, 31]  # odd lengths are rounded up to the next even length
+
+
+def reference(curve, window_len, window_type):
+    """Scipy Cookbook smoothing with np.convolve, the recipe LF.smooth() started from."""
+    if window_len % 2:
+        window_len += 1
+    s = np.r_[curve[window_len-1:0:-1], curve, curve[-1:-window_len:-1]]
+    if window_type == 'flat':
+        w = np.ones(window_len)
+    else:
+        w = getattr(np, window_type)(window_len)
+    otpt = np.convolve(w/w.sum(), s, mode='valid')
+    return otpt[int(window_len/2-1):-int(window_len/2)]
+
+
+@pytest.fixture(scope='module')
+def cube():
+    rng = np.random.RandomState(0)
+    # smooth background with noise, shaped like LEEM I(V) data
+    energies = np.linspace(0, 6, 70)
+    return (1000*np.exp(-energies)[None, None, :] + rng.randint(0, 200, size=(9, 11, 70))).astype(np.uint16)
+
+
+@pytest.mark.parametrize('window_type', LF.WINDOW_TYPES)
+@pytest.mark.parametrize('window_len', WINDOW_LENS)
+def test_smooth_matches_reference(cube, window_type, window_len):
+    curve = cube[3, 4].astype(np.float64)
+    smoothed = LF.smooth(curve, window_len=window_len, window_type=window_type)
+    assert smoothed.shape == curve.shape
+    np.testing.assert_allclose(smoothed, reference(curve, window_len, window_type), rtol=1e-10)
+
+
+@pytest.mark.parametrize('method', ['auto', 'direct', 'fft'])
+@pytest.mark.parametrize('window_type', LF.WINDOW_TYPES)
+@pytest.mark.parametrize('window_len', WINDOW_LENS)
+def test_smooth_cube_methods(cube, method, window_type, window_len):
+    smoothed = LF.smooth_cube(cube, window_len=window_len, window_type=window_type,
+                              method=method, chunk_rows=4)
+    assert smoothed.shape == cube.shape
+    for r, c in [(0, 0), (3, 4), (8, 10)]:
+        expected = LF.smooth(cube[r, c], window_len=window_len, window_type=window_type)
+        np.testing.assert_allclose(smoothed[r, c], expected, rtol=1e-8)
+
+
+@pytest.mark.parametrize('window_len', WINDOW_LENS)
+def test_moving_average(cube, window_len):
+    # the running sum used for the flat window and the fft path on the same padded curves
+    window_len += window_len % 2
+    num = cube.shape[2]
+    start = int(window_len/2 - 1) + window_len - 1
+    s = np.concatenate((cube[..., window_len-1:0:-1], cube, cube[..., -1:-window_len:-1]), axis=2)
+    s = s.astype(np.float64)
+    flat = LF.moving_average(s, window_len, start, num)
+    fft = LF.fft_convolve(s, LF.get_window('flat', window_len), start, num)
+    np.testing.assert_allclose(flat, fft, rtol=1e-8)
+    np.testing.assert_allclose(flat[2, 5], LF.smooth(cube[2, 5], window_len=window_len), rtol=1e-10)
+
+
+@pytest.mark.parametrize('window_type', LF.WINDOW_TYPES)
+@pytest.mark.parametrize('window_len', WINDOW_LENS)
+def test_smoother(cube, window_type, window_len):
+    smoother = LF.Smoother(window_len, window_type)
+    out = np.empty(cube.shape[2])
+    for r, c in [(0, 0), (3, 4), (8, 10)]:
+        expected = LF.smooth(cube[r, c], window_len=window_len, window_type=window_type)
+        np.testing.assert_allclose(smoother(cube[r, c]), expected, rtol=1e-10)
+        # buffers are reused between calls
+        assert smoother(cube[r, c], out=out) is out
+        np.testing.assert_allclose(out, expected, rtol=1e-10)
+
+
+def test_invalid_settings(cube):
+    assert LF.smooth(cube[0, 0], window_len=2) is None
+    assert LF.smooth(cube[0, 0], window_type='gaussian') is None
+    assert LF.smooth_cube(cube, window_len=2) is None
+    assert LF.smooth_cube(cube, window_type='gaussian') is None
+    assert LF.smooth_cube(cube, method='spline') is None
+    assert LF.smooth_cube(cube, window_len=cube.shape[2] + 2) is None
+
+
+@pytest.mark.parametrize('window_type', ['flat', 'hanning'])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_smooth_cube_parallel(cube, window_type, dtype):
+    pytest.importorskip('multiprocessing.shared_memory')
+    expected = LF.smooth_cube(cube, window_len=10, window_type=window_type)
+    counts = []
+    smoothed = LF.smooth_cube_parallel(cube, window_len=10, window_type=window_type, workers=2, tile=4,
+                                       callback=lambda count, total: counts.append((count, total)),
+                                       dtype=dtype)
+    assert smoothed.dtype == dtype
+    np.testing.assert_allclose(smoothed, expected, rtol=1e-5 if dtype == np.float32 else 1e-10)
+    assert counts[-1] == (9, 9)  # 3 x 3 tiles of up to 4 x 4 pixels
+
+
+def test_smooth_cube_parallel_cancel(cube):
+    pytest.importorskip('multiprocessing.shared_memory')
+    assert LF.smooth_cube_parallel(cube, workers=1, tile=4, cancel=lambda: True) is None
+
+
+@pytest.mark.parametrize('window_type', ['flat', 'blackman'])
+def test_smooth_tile_cache(cube, window_type):
+    dat = data.LeemData()
+    dat.set_data(cube)
+    expected = LF.smooth_cube(cube, window_len=10, window_type=window_type)
+    cache = SmoothTileCache(dat, window_len=10, window_type=window_type, tile=4, dtype=np.float64)
+    np.testing.assert_allclose(cache.curve(5, 9), expected[5, 9], rtol=1e-12)
+    # only the tile holding (5, 9) has been smoothed
+    assert cache.done.sum() == 1 and cache.done[1, 2]
+    assert cache.nbytes == 4*3*cube.shape[2]*8  # last tile column is 3 pixels wide
+    for r, c in [(4, 8), (7, 10), (0, 0), (8, 0)]:
+        np.testing.assert_allclose(cache.curve(r, c), expected[r, c], rtol=1e-12)
+
+    cache.clear()
+    assert not cache.done.any() and cache.nbytes == 0
+    cache.fill(expected)
+    assert cache.done.all()
+    np.testing.assert_array_equal(cache.curve(8, 10), expected[8, 10])
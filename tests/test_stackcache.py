@@ -0,0 +1,85 @@
+"""Tests of the persistent cache of loaded data sets."""
+import os
+import numpy as np
+import stackcache
+
+
+def make_files(path, num=3, size=16):
+    path.mkdir(exist_ok=True)
+    for idx in range(num):
+        (path / 'img{:03d}.dat'.format(idx)).write_bytes(b'\0'*size)
+
+
+def test_round_trip(tmp_path):
+    datadir, cachedir = tmp_path / 'data', str(tmp_path / 'cache')
+    make_files(datadir)
+    params = {'imht': 6, 'imwd': 5, 'bits': 16}
+    key = stackcache.cache_key(str(datadir), '.dat', params)
+    data = np.arange(6*5*3, dtype='>u2').reshape(6, 5, 3)
+    elist = [20.0, 20.5, 21.0]
+    fl = stackcache.write_cache(str(datadir), key, data, elist=elist, params=params, cachedir=cachedir)
+    assert fl == stackcache.cache_path(str(datadir), cachedir)
+    assert not os.path.exists(fl + '.tmp')
+
+    cached, header = stackcache.read_cache(str(datadir), key, cachedir=cachedir)
+    assert cached.shape == data.shape
+    assert cached.dtype == data.dtype
+    np.testing.assert_array_equal(cached, data)
+    assert header['elist'] == elist
+    assert header['params'] == params
+
+
+def test_key_depends_on_files_and_params(tmp_path):
+    datadir = tmp_path / 'data'
+    make_files(datadir)
+    key = stackcache.cache_key(str(datadir), '.dat', {'bits': 16})
+    assert key == stackcache.cache_key(str(datadir), '.dat', {'bits': 16})
+    assert key != stackcache.cache_key(str(datadir), '.dat', {'bits': 8})
+    (datadir / 'img003.dat').write_bytes(b'\0'*16)
+    assert key != stackcache.cache_key(str(datadir), '.dat', {'bits': 16})
+
+
+def test_stale_key(tmp_path):
+    datadir, cachedir = tmp_path / 'data', str(tmp_path / 'cache')
+    make_files(datadir)
+    key = stackcache.cache_key(str(datadir), '.dat')
+    stackcache.write_cache(str(datadir), key, np.zeros((4, 4, 3), dtype=np.uint8), cachedir=cachedir)
+    # a file written after the cache changes the key of the directory
+    make_files(datadir, num=4, size=32)
+    stale = stackcache.cache_key(str(datadir), '.dat')
+    assert stale != key
+    assert stackcache.read_cache(str(datadir), stale, cachedir=cachedir) is None
+
+
+def test_missing_or_incomplete_cache(tmp_path):
+    datadir, cachedir = tmp_path / 'data', str(tmp_path / 'cache')
+    make_files(datadir)
+    key = stackcache.cache_key(str(datadir), '.dat')
+    assert stackcache.read_cache(str(datadir), key, cachedir=cachedir) is None
+    fl = stackcache.write_cache(str(datadir), key, np.ones((4, 4, 3), dtype=np.uint16), cachedir=cachedir)
+    with open(fl, 'r+b') as f:
+        f.truncate(os.path.getsize(fl) - 2)
+    assert stackcache.read_cache(str(datadir), key, cachedir=cachedir) is None
+
+
+def test_prune_least_recently_used(tmp_path):
+    cachedir = str(tmp_path / 'cache')
+    files = []
+    for idx in range(3):
+        datadir = tmp_path / 'data{}'.format(idx)
+        make_files(datadir)
+        key = stackcache.cache_key(str(datadir), '.dat')
+        fl = stackcache.write_cache(str(datadir), key, np.zeros((64, 64, 4), dtype=np.uint16), cachedir=cachedir)
+        os.utime(fl, (1000 + idx, 1000 + idx))
+        files.append((datadir, key, fl))
+    # reading the oldest cache marks it as recently used
+    datadir, key, fl = files[0]
+    assert stackcache.read_cache(str(datadir), key, cachedir=cachedir) is not None
+
+    size = os.path.getsize(fl)
+    deleted = stackcache.prune_cache(cachedir, max_bytes=2*size)
+    assert deleted == [files[1][2]]
+    assert stackcache.prune_cache(cachedir, max_bytes=2*size) == []
+    # the cache just written is kept even if it alone exceeds the budget
+    assert stackcache.prune_cache(cachedir, max_bytes=0, keep=files[2][2]) == [files[0][2]]
+    assert os.path.exists(files[2][2])
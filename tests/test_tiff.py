@@ -0,0 +1,166 @@
+"""Tests of the TIFF directory parser and in place reads of uncompressed pages."""
+import struct
+import numpy as np
+import pytest
+from PIL import Image
+import LEEMFUNCTIONS as LF
+
+
+def write_tiff(path, frames, bo='<', photometric=1, strips=1):
+    """
+    Write uncompressed greyscale pages with a minimal set of tags
+    :param frames: list of 2d numpy arrays, one per page
+    :param bo: string struct byte order character, '<' or '>'
+    :param photometric: integer PhotometricInterpretation written to every page
+    :param strips: integer number of strips per page
+    """
+    out = bytearray((b'II' if bo == '<' else b'MM') + struct.pack(bo + 'HI', 42, 0))
+    prev = 4  # position of the offset pointing at the next IFD
+    for frame in frames:
+        ht, wd = frame.shape
+        rows = -(-ht // strips)
+        pixels = np.ascontiguousarray(frame, dtype=frame.dtype.newbyteorder(bo)).tobytes()
+        start = len(out)
+        out += pixels
+        rowbytes = wd*frame.dtype.itemsize
+        offsets = [start + r*rowbytes for r in range(0, ht, rows)]
+        counts = [min(rows, ht - r)*rowbytes for r in range(0, ht, rows)]
+        # out of line strip offsets and counts
+        arrays = len(out)
+        out += struct.pack(bo + '{}I'.format(strips), *offsets)
+        out += struct.pack(bo + '{}I'.format(strips), *counts)
+        entries = [(256, 4, 1, wd), (257, 4, 1, ht), (258, 3, 1, frame.dtype.itemsize*8),
+                   (259, 3, 1, 1), (262, 3, 1, photometric), (273, 4, strips, offsets[0]),
+                   (277, 3, 1, 1), (278, 4, 1, rows), (279, 4, strips, counts[0])]
+        ifd = len(out)
+        struct.pack_into(bo + 'I', out, prev, ifd)
+        out += struct.pack(bo + 'H', len(entries))
+        for code, ftype, count, value in entries:
+            if count > 1:
+                value = arrays if code == 273 else arrays + 4*strips
+                out += struct.pack(bo + 'HHII', code, ftype, count, value)
+            elif ftype == 3:
+                out += struct.pack(bo + 'HHIHH', code, ftype, count, value, 0)
+            else:
+                out += struct.pack(bo + 'HHII', code, ftype, count, value)
+        prev = len(out)
+        out += struct.pack(bo + 'I', 0)
+    with open(path, 'wb') as f:
+        f.write(bytes(out))
+
+
+def frames(num, ht=13, wd=7, dtype=np.uint16):
+    return [(np.arange(ht*wd).reshape(ht, wd)*(idx + 1)).astype(dtype) for idx in range(num)]
+
+
+@pytest.mark.parametrize('bo', ['<', '>'])
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16])
+def test_single_page(tmp_path, bo, dtype):
+    path = str(tmp_path / 'page.tif')
+    frame = frames(1, dtype=dtype)[0]
+    write_tiff(path, [frame], bo=bo, strips=3)
+    info = LF.parse_tiff(path)
+    assert len(info) == 1
+    assert info[0]['byte_order'] == bo
+    assert (info[0]['height'], info[0]['width']) == frame.shape
+    assert info[0]['bits'] == frame.dtype.itemsize*8
+    assert info[0]['photometric'] == 1
+    assert len(info[0]['offsets']) == 3
+    np.testing.assert_array_equal(LF.read_tiff(path), frame)
+    np.testing.assert_array_equal(LF.decode_img(path), frame)
+    np.testing.assert_array_equal(LF.pil_to_array(Image.open(path)), frame)
+
+
+@pytest.mark.parametrize('bo', ['<', '>'])
+def test_multi_page(tmp_path, bo):
+    path = str(tmp_path / 'stack.tif')
+    pages = frames(5)
+    write_tiff(path, pages, bo=bo)
+    assert len(LF.parse_tiff(path)) == 1
+    info = LF.parse_tiff(path, pages=None)
+    assert len(info) == 5
+    for idx, page in enumerate(info):
+        np.testing.assert_array_equal(LF.read_tiff(path, page), pages[idx])
+
+    stack = LF.TiffStack(path)
+    try:
+        assert stack.shape == (13, 7, 5)
+        for idx in range(5):
+            np.testing.assert_array_equal(stack.get_frame(idx), pages[idx])
+        np.testing.assert_array_equal(stack[4, 2, :], [page[4, 2] for page in pages])
+    finally:
+        stack.close()
+
+
+def test_white_is_zero_is_decoded(tmp_path):
+    path = str(tmp_path / 'inverted.tif')
+    frame = frames(1, dtype=np.uint8)[0]
+    write_tiff(path, [frame], photometric=0)
+    info = LF.parse_tiff(path)[0]
+    assert info['photometric'] == 0
+    assert LF.tiff_data_offset(info) is None
+    assert LF.read_tiff(path) is None
+    np.testing.assert_array_equal(LF.decode_img(path), LF.pil_to_array(Image.open(path)))
+
+
+def test_not_a_tiff(tmp_path):
+    path = tmp_path / 'bad.tif'
+    path.write_bytes(b'XX' + b'\0'*30)
+    with pytest.raises(LF.ParseError):
+        LF.parse_tiff(str(path))
+
+
+def test_no_image_directory(tmp_path):
+    # header written before the first IFD, as libtiff does while a file is being written
+    path = tmp_path / 'partial.tif'
+    path.write_bytes(b'II' + struct.pack('<HI', 42, 0) + b'\0'*64)
+    with pytest.raises(LF.ParseError):
+        LF.parse_tiff(str(path))
+    with pytest.raises(LF.ParseError):
+        LF.read_tiff(str(path))
+
+
+@pytest.mark.parametrize('bo', ['<', '>'])
+def test_truncated_file(tmp_path, bo):
+    path = str(tmp_path / 'page.tif')
+    write_tiff(path, frames(1), bo=bo, strips=3)
+    with open(path, 'rb') as f:
+        whole = f.read()
+    ifd = struct.unpack(bo + 'I', whole[4:8])[0]
+    # IFD offset past the end of the file
+    with open(path, 'wb') as f:
+        f.write(whole[:4] + struct.pack(bo + 'I', len(whole) + 100) + whole[8:])
+    with pytest.raises(LF.ParseError):
+        LF.parse_tiff(path)
+    # file cut off inside the IFD entries and before the out of line strip offsets
+    for size in (ifd + 1, ifd + 20):
+        with open(path, 'wb') as f:
+            f.write(whole[:size])
+        with pytest.raises(LF.ParseError):
+            LF.parse_tiff(path)
+    # out of line strip offsets (sixth entry) stored past the end of the file
+    with open(path, 'wb') as f:
+        f.write(whole)
+        f.seek(ifd + 2 + 5*12 + 8)
+        f.write(struct.pack(bo + 'I', len(whole) - 4))
+    with pytest.raises(LF.ParseError):
+        LF.parse_tiff(path)
+
+
+@pytest.mark.parametrize('photometric', [0, 1])
+def test_convert_to_dat(tmp_path, photometric):
+    indir, outdir = tmp_path / 'tif', tmp_path / 'dat'
+    indir.mkdir()
+    outdir.mkdir()
+    pages = frames(3, dtype=np.uint8)
+    files = []
+    for idx, frame in enumerate(pages):
+        files.append('img{}.tif'.format(idx))
+        write_tiff(str(indir / files[-1]), [frame], photometric=photometric)
+    payload = pages[0].nbytes
+    assert LF.dat_header(str(indir), files, payload) is None
+    assert LF.convert_to_dat(str(indir), str(outdir), files, None, payload, workers=2) == []
+    for name, frame in zip(files, pages):
+        converted = np.fromfile(str(outdir / name.replace('.tif', '.dat')), dtype=np.uint8).reshape(frame.shape)
+        # WhiteIsZero pages are decoded as they are when loading images
+        np.testing.assert_array_equal(converted, LF.decode_img(str(indir / name)))